@@ -112,7 +112,7 @@ def login():
     # Obtener el logo del usuario
     logo = Logo.query.filter_by(user_id=user.id).first()
     # "https://placehold.co/600x400/EEE/31343C"
-    logo_url = logo.logo_url if logo else None
+    logo_url = logo.get_logo_url() if logo else None
 
     # Incluir información en el token
     token_data = {
@@ -59,7 +59,7 @@ def get_store_details(store_name):
     store_details = {
         "store": shop.serialize(),
         "user": user.serialize(),
-        "products": [product.serialize() for product in products],
+        "products": Productos.serialize_many(products),
     }
     
     return jsonify(store_details), 200
@@ -143,7 +143,7 @@ def get_store_info():
 
     # Buscar el logo del usuario
     logo = Logo.query.filter_by(user_id=user_id).first()
-    logo_url = logo.logo_url if logo else None
+    logo_url = logo.get_logo_url() if logo else None
 
     # Preparar la información de la tienda
     store_info = {
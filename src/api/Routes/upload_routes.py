@@ -1,14 +1,31 @@
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from api.models import db, User, Productos, TigrisFiles
-from flask import Blueprint, request, jsonify, send_file
+from api.models import db, User, Productos, TigrisFiles, InventoryJob, UploadSession, ProductImage
+from api.service.inventory_import import (
+    iter_inventory_frames, records_from_frames, allowed_inventory_file,
+    inventory_format, InventoryFormatError)
+from api.service.bulk_insert import upsert_productos, predict_changes
+from api.service.import_jobs import create_job, create_job_for_path, submit_job
+from api.service.chunked_upload import (
+    create_session, save_chunk, received_ranges, missing_chunks, complete_session,
+    remove_session_files, session_expired, session_expires_at, ChunkError, UPLOAD_MAX_BYTES)
+from api.service.inventory_validation import InventoryValidator, InventoryValidationError
+from api.service.archive import spool_copy, start_archive, finish_archive
+from api.service.image_variants import start_variants
+from api.service.storage import get_s3_client, ensure_bucket, upload_stream, upload_path, INVENTORY_BUCKET
+from api.service.presign import presigned_url, object_key_from_url
+from api.service.inventory_export import (
+    has_products, count_products, iter_inventory_export, inventory_template, export_filename,
+    parse_export_filename, ChunkReader, EXPORT_FORMATS, XLSX_MIMETYPE)
+from api.service.export_cache import (
+    export_cache, export_key, iter_and_cache, bump_inventory_version, current_inventory_version)
+from flask import Blueprint, Response, request, jsonify, current_app, stream_with_context
 from werkzeug.utils import secure_filename
-from botocore.client import Config
 from dotenv import load_dotenv
-from io import BytesIO
-import pandas as pd
 import traceback
 import datetime
-import boto3
+import time
+import io
+import mimetypes
 import uuid
 import os
 import re
@@ -17,25 +34,24 @@ import re
 load_dotenv()
 upload = Blueprint('upload', __name__)
 
-# Configuración de AWS/Tigris (cliente S3 global)
-AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_ENDPOINT_URL_S3 = os.getenv("AWS_ENDPOINT_URL_S3")
-AWS_REGION = os.getenv("AWS_REGION", "auto")
-BUCKET_NAME = "inventary-user-2025"
-config = Config(signature_version='s3v4')
+# Bucket de Tigris para inventarios e imágenes (el cliente está en api.service.storage)
+BUCKET_NAME = INVENTORY_BUCKET
 
-s3 = boto3.client(
-    's3',
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-    endpoint_url=AWS_ENDPOINT_URL_S3,
-    region_name=AWS_REGION,
-    config=config
-)
+# Tipos de contenido de los archivos de inventario que se archivan en Tigris
+INVENTORY_CONTENT_TYPES = {
+    "xlsx": 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    "xls": 'application/vnd.ms-excel',
+    "csv": 'text/csv',
+    "parquet": 'application/vnd.apache.parquet',
+    "arrow": 'application/vnd.apache.arrow.file'
+}
 
-UPLOAD_FOLDER = "upload"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Validez de las URLs prefirmadas de las exportaciones en segundo plano
+EXPORT_URL_EXPIRES = int(os.getenv("EXPORT_URL_EXPIRES", 3600))
+
+# Filas que se leen por defecto (y como máximo) en una simulación (?dry_run=1)
+DRY_RUN_ROWS = int(os.getenv("DRY_RUN_ROWS", 100))
+DRY_RUN_MAX_ROWS = int(os.getenv("DRY_RUN_MAX_ROWS", 1000))
 
 
 # Función auxiliar para verificar extensiones de archivo permitidas
@@ -45,19 +61,29 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+# Función auxiliar para generar la clave única de un objeto en Tigris
+def make_object_key(file_name, folder_prefix=None):
+    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+
+    # Añadir prefijo de carpeta si se especifica
+    key_prefix = f"{folder_prefix}/" if folder_prefix else ""
+    return f"{key_prefix}{timestamp}_{file_name}"
+
+
 # Función auxiliar para subir archivos a Tigris S3
-def upload_to_tigris_s3(file_path, file_name, folder_prefix=None):
+def upload_to_tigris_s3(file_path, file_name, folder_prefix=None, content_type=None, object_key=None):
+    """
+    Sube un archivo a Tigris y devuelve una URL prefirmada (ver api.service.presign)
+
+    `file_path` puede ser una ruta, los bytes del archivo o un objeto archivo
+    (por ejemplo el stream de la subida, que se envía sin pasar por disco).
+    Si no se indica `object_key` se genera una clave con marca de tiempo.
+    """
     try:
-        try:
-            s3.head_bucket(Bucket=BUCKET_NAME)
-        except:
-            s3.create_bucket(Bucket=BUCKET_NAME)
+        ensure_bucket(BUCKET_NAME)
 
-        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        
-        # Añadir prefijo de carpeta si se especifica
-        key_prefix = f"{folder_prefix}/" if folder_prefix else ""
-        unique_filename = f"{key_prefix}{timestamp}_{file_name}"
+        s3 = get_s3_client()
+        unique_filename = object_key or make_object_key(file_name, folder_prefix)
 
         # Si file_path es bytes (para imágenes)
         if isinstance(file_path, bytes):
@@ -65,30 +91,226 @@ def upload_to_tigris_s3(file_path, file_name, folder_prefix=None):
                 Body=file_path,
                 Bucket=BUCKET_NAME,
                 Key=unique_filename,
-                ContentType='image/jpeg'  # Ajustar según la extensión
+                ContentType=content_type or 'image/jpeg'
             )
+        elif hasattr(file_path, 'read'):
+            # Stream en memoria (o archivo temporal privado si es muy grande):
+            # los archivos grandes se suben por partes en paralelo
+            file_path.seek(0)
+            upload_stream(file_path, BUCKET_NAME, unique_filename,
+                          content_type or INVENTORY_CONTENT_TYPES['xlsx'])
+            file_path.seek(0)
         else:
-            s3.upload_file(
-                file_path,
-                BUCKET_NAME,
-                unique_filename,
-                ExtraArgs={
-                    'ContentType': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                }
-            )
+            upload_path(file_path, BUCKET_NAME, unique_filename,
+                        content_type or INVENTORY_CONTENT_TYPES['xlsx'])
 
-        url = s3.generate_presigned_url(
-            'get_object',
-            Params={'Bucket': BUCKET_NAME, 'Key': unique_filename},
-            ExpiresIn=3600 * 24 * 7
-        )
-
-        return url
+        # Firma local (y en caché): la clave es lo que se debe guardar
+        return presigned_url(BUCKET_NAME, unique_filename)
 
     except Exception as e:
         raise Exception(f"Error al subir a Tigris S3: {str(e)}")
 
 
+def product_image_fields(data):
+    """
+    Campos de imagen de un producto a partir del JSON de la petición
+
+    Si la imagen está en nuestro bucket se guarda su clave (y no la URL
+    prefirmada, que caduca). Acepta `image_object_key` (devuelto por
+    /upload-product-image) o una `image_url` prefirmada de nuestro bucket.
+
+    Returns:
+        Tupla (image_url, image_object_key)
+    """
+    object_key = data.get('image_object_key') or object_key_from_url(data.get('image_url'), BUCKET_NAME)
+    if object_key:
+        return '', object_key
+    return data.get('image_url') or '', None
+
+
+# Función auxiliar que procesa un archivo de inventario completo
+def process_inventory_file(user_id, source, filename, kind, on_progress=None):
+    """
+    Valida y hace el upsert de los productos del archivo en una sola lectura,
+    lo archiva en Tigris en segundo plano y lo registra en TigrisFiles. Hace
+    commit al final.
+
+    Se usa tanto desde los endpoints como desde los trabajos en segundo plano.
+
+    Args:
+        user_id: Usuario propietario del inventario
+        source: Stream de la subida o ruta local del archivo (trabajos)
+        filename: Nombre original del archivo
+        kind: "upload" (cargar) o "update" (actualizar)
+        on_progress: Función opcional que recibe las filas procesadas
+
+    Returns:
+        Tupla (tigris_file, stats); el archivo queda en estado "pending"
+        hasta que termina la subida. Si el contenido es idéntico al último
+        archivo del usuario se devuelve ese archivo y stats["duplicate"]
+
+    Raises:
+        InventoryValidationError: Si alguna fila no es válida (con el informe)
+    """
+    # Copia privada del archivo + SHA-256 en una sola pasada
+    data, content_sha256 = spool_copy(source)
+
+    # Si es idéntico al último archivo importado, ese archivo se archivó (o se
+    # está archivando) y el inventario no ha cambiado desde entonces, no hay
+    # nada que hacer: ni subida a Tigris, ni lectura, ni escrituras
+    latest_file = TigrisFiles.query.filter_by(
+        user_id=user_id).order_by(TigrisFiles.id.desc()).first()
+    if (latest_file and latest_file.content_sha256 == content_sha256
+            and latest_file.status in ("stored", "pending")
+            and latest_file.inventory_version is not None
+            and latest_file.inventory_version == current_inventory_version(user_id)):
+        data.close()
+        return latest_file, {
+            "added": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "low_stock": 0,
+            "low_stock_products": [],
+            "seconds": 0,
+            "rows_per_sec": 0,
+            "duplicate": True
+        }
+
+    try:
+        # Una sola lectura: cada bloque se valida y sus filas válidas (con los
+        # valores ya convertidos) se escriben por bloques con la clave
+        # (user_id, product_name); los contadores salen de las sentencias.
+        # Desde la primera fila con errores no se escribe nada más
+        validator = InventoryValidator()
+        frames = validator.valid_frames(iter_inventory_frames(source, filename))
+        stats = upsert_productos(
+            records_from_frames(frames), user_id, on_progress=on_progress)
+
+        # Si alguna fila tiene errores no se guarda nada ni se archiva el archivo
+        report = validator.report()
+        if report["error_rows"]:
+            raise InventoryValidationError(report)
+    except Exception:
+        db.session.rollback()
+        data.close()
+        raise
+
+    stats["low_stock"] = report["low_stock"]
+    stats["low_stock_products"] = report["low_stock_products"]
+
+    # Las actualizaciones se guardan como respaldo sin eliminar el anterior.
+    # La subida a Tigris corre en segundo plano
+    prefix = "update_" if kind == "update" else ""
+    archive_name = f"{prefix}{filename}"
+    object_key = make_object_key(archive_name)
+    content_type = INVENTORY_CONTENT_TYPES[inventory_format(filename)]
+    archive = start_archive(
+        upload_to_tigris_s3, data, archive_name, object_key, content_type)
+
+    try:
+        if stats["added"] or stats["updated"]:
+            bump_inventory_version(user_id)
+
+        tigris_file = TigrisFiles(
+            object_key=object_key, status="pending",
+            content_sha256=content_sha256, user_id=user_id,
+            inventory_version=current_inventory_version(user_id))
+        db.session.add(tigris_file)
+        db.session.commit()
+    except Exception:
+        # Si el registro no se guarda no hace falta archivar (si aún no ha empezado)
+        if archive.cancel():
+            data.close()
+        raise
+
+    # El registro pasa a "stored" (con su URL) cuando termina la subida
+    finish_archive(current_app._get_current_object(), archive, tigris_file.id)
+
+    return tigris_file, stats
+
+
+# Función auxiliar que genera una exportación del inventario en Tigris
+def export_inventory_file(user_id, filename):
+    """
+    Genera la exportación del inventario y la sube a Tigris a la vez (por
+    partes, sin guardarla entera en memoria ni en disco). Se usa desde los
+    trabajos en segundo plano.
+
+    Args:
+        user_id: Usuario propietario del inventario
+        filename: Nombre de la exportación (ver export_filename)
+
+    Returns:
+        Diccionario con la clave del objeto, el nombre, filas y bytes
+    """
+    export_format, compress = parse_export_filename(filename)
+    object_key = make_object_key(filename, "exports")
+    rows = count_products(user_id)
+
+    ensure_bucket(BUCKET_NAME)
+    reader = ChunkReader(iter_inventory_export(user_id, export_format, compress))
+    mimetype = "application/gzip" if compress else EXPORT_FORMATS[export_format][0]
+    upload_stream(io.BufferedReader(reader, buffer_size=1024 * 1024),
+                  BUCKET_NAME, object_key, mimetype)
+
+    return {
+        "object_key": object_key,
+        "filename": filename,
+        "rows": rows,
+        "bytes": reader.bytes_read
+    }
+
+
+def wants_async():
+    """El cliente pide procesar la importación en segundo plano (?async=1)"""
+    return request.args.get("async", "").lower() in ("1", "true", "yes")
+
+
+def wants_dry_run():
+    """El cliente solo quiere comprobar el archivo (?dry_run=1)"""
+    return request.args.get("dry_run", "").lower() in ("1", "true", "yes")
+
+
+def dry_run_inventory(user_id, file):
+    """
+    Simula la importación con la cabecera y las primeras filas del archivo:
+    valida esas filas y calcula cuántos productos se añadirían o actualizarían.
+    No archiva el archivo ni escribe en la base de datos.
+    """
+    start = time.perf_counter()
+    max_rows = min(request.args.get("rows", DRY_RUN_ROWS, type=int), DRY_RUN_MAX_ROWS)
+
+    frames = list(iter_inventory_frames(file.stream, file.filename, max_rows=max(max_rows, 1)))
+    validator = InventoryValidator()
+    valid_frames = [validator.check(df) for df in frames]
+    validation = validator.report()
+    records = list(records_from_frames(frames))
+    prediction = predict_changes(records_from_frames(valid_frames), user_id)
+    db.session.rollback()
+
+    return jsonify({
+        "message": f"Simulación con las primeras {validation['rows']} filas: "
+                   f"{prediction['added']} se añadirían, {prediction['updated']} se actualizarían, "
+                   f"{validation['error_rows']} con errores",
+        "dry_run": True,
+        "validation": validation,
+        "prediction": prediction,
+        "preview": records,
+        "seconds": round(time.perf_counter() - start, 3)
+    }), 200
+
+
+def enqueue_inventory_job(user_id, kind, file):
+    """Crea el trabajo de importación y responde 202 con su id"""
+    job = create_job(user_id, kind, file)
+    submit_job(current_app._get_current_object(), job.id)
+    return jsonify({
+        "message": "Importación en cola",
+        "job": job.serialize(),
+        "status_url": f"/upload/jobs/{job.id}"
+    }), 202
+
+
 # -------------ENDPOINT PARA SUBIR EL INVENTARIO A TIGRIS-----------------
 @upload.route('/inventory', methods=['POST'])
 @jwt_required()
@@ -102,110 +324,283 @@ def upload_inventory():
         return jsonify({"error": "No se encontró archivo en la solicitud"}), 400
 
     file = request.files["file"]
-    if not file.filename.endswith((".xls", ".xlsx")):
-        return jsonify({"error": "Solo se permiten archivos Excel (.xls, .xlsx)"}), 400
+    if not allowed_inventory_file(file.filename):
+        return jsonify({"error": "Formato no permitido. Use Excel (.xls, .xlsx), CSV (.csv, .csv.gz), Parquet o Arrow"}), 400
+
+    try:
+        # Simulación: solo cabecera y primeras filas, sin guardar nada
+        if wants_dry_run():
+            return dry_run_inventory(user.id, file)
+    except InventoryFormatError as e:
+        return jsonify({"error": str(e)}), 400
 
-    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(file_path)
+    # Importación en segundo plano: la petición termina en milisegundos
+    if wants_async():
+        return enqueue_inventory_job(user_id, "upload", file)
 
     try:
-        file_url = upload_to_tigris_s3(file_path, file.filename)
-        df = pd.read_excel(file_path)
-
-        expected_columns = ['nombre_del_producto',
-                            'precio_por_unidad', 'descripción', 'unidades']
-        if not all(col in df.columns for col in expected_columns):
-            return jsonify({"error": "El archivo Excel no contiene las columnas esperadas"}), 400
-
-        df.columns = [col.lower().replace(' ', '_') for col in df.columns]
-        records = df.to_dict(orient="records")
-
-        # Lista para almacenar productos con stock bajo
-        low_stock_products = []
-
-        for record in records:
-            quantity = record['unidades']
-            producto = Productos(
-                product_name=record['nombre_del_producto'],
-                price_per_unit=record['precio_por_unidad'],
-                description=record['descripción'],
-                quantity=quantity,
-                user_id=user_id
-            )
-            db.session.add(producto)
-            
-            # Verificar si el producto tiene 5 o menos unidades
-            if quantity <= 5:
-                low_stock_products.append({
-                    'product_name': record['nombre_del_producto'],
-                    'quantity': quantity
-                })
-
-        tigris_file = TigrisFiles(url=file_url, user_id=user_id)
-        db.session.add(tigris_file)
-        db.session.commit()
-        
+        # El archivo se procesa desde el stream de la subida, sin copiarlo
+        # a la carpeta de trabajo
+        tigris_file, stats = process_inventory_file(
+            user_id, file.stream, file.filename, "upload")
+
+        if stats.get("duplicate"):
+            return jsonify({
+                "message": "Sin cambios: el archivo es idéntico al último inventario subido",
+                "file_id": tigris_file.id,
+                "file_status": tigris_file.status,
+                "stats": stats
+            })
+
         return jsonify({
-            "message": f"Inventario cargado correctamente. {len(low_stock_products)} productos con stock bajo.",
-            "file_url": file_url
+            "message": f"Inventario cargado correctamente. {stats['low_stock']} productos con stock bajo.",
+            "file_id": tigris_file.id,
+            "file_status": tigris_file.status,
+            "stats": stats
         })
 
+    except InventoryValidationError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e), "validation": e.report}), 400
+    except InventoryFormatError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+
+
+# -------------ENDPOINT PARA CONSULTAR UN TRABAJO DE IMPORTACIÓN-----------------------
+@upload.route("/jobs/<int:job_id>", methods=["GET"])
+@jwt_required()
+def get_inventory_job(job_id):
+    """Devuelve el estado y el progreso de un trabajo de importación o exportación"""
+    user_id = get_jwt_identity()
+    if isinstance(user_id, str) and user_id.isdigit():
+        user_id = int(user_id)
+
+    job = db.session.get(InventoryJob, job_id)
+    if not job or job.user_id != user_id:
+        return jsonify({"error": "Trabajo no encontrado"}), 404
+
+    response = {"job": job.serialize()}
+
+    # Exportación terminada: URL prefirmada (admite peticiones Range)
+    if job.kind == "export" and job.status == "done":
+        response["download_url"] = get_s3_client().generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': BUCKET_NAME,
+                'Key': job.result['object_key'],
+                'ResponseContentDisposition': f"attachment; filename={job.result['filename']}"
+            },
+            ExpiresIn=EXPORT_URL_EXPIRES
+        )
+        response["expires_in"] = EXPORT_URL_EXPIRES
+
+    return jsonify(response), 200
+
+
+# -------------ENDPOINTS DE SUBIDA POR PARTES (REANUDABLE)-----------------------
+def get_upload_session(session_id):
+    """Devuelve la subida si existe y es del usuario autenticado (o None)"""
+    user_id = get_jwt_identity()
+    if isinstance(user_id, str) and user_id.isdigit():
+        user_id = int(user_id)
+
+    session = db.session.get(UploadSession, session_id)
+    if not session or session.user_id != user_id:
+        return None
+    return session
+
+
+def upload_session_status(session):
+    """Estado de la subida: rangos recibidos y partes que faltan"""
+    is_open = session.status == "open"
+    return {
+        "session": session.serialize(),
+        "received": received_ranges(session),
+        "missing_chunks": missing_chunks(session) if is_open else [],
+        "expires_at": session_expires_at(session).isoformat() if is_open else None
+    }
+
+
+@upload.route("/sessions", methods=["POST"])
+@jwt_required()
+def initiate_upload_session():
+    """
+    Inicia una subida por partes de un archivo de inventario
+
+    Body JSON: filename, total_size (bytes) y kind ("upload" o "update").
+    Después cada parte se envía con PUT /upload/sessions/<id>/chunks/<n>.
+    """
+    user_id = get_jwt_identity()
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "Usuario no encontrado"}), 404
+
+    data = request.get_json(silent=True) or {}
+    filename = data.get("filename")
+    total_size = data.get("total_size")
+    kind = data.get("kind", "upload")
+
+    if not filename or not allowed_inventory_file(filename):
+        return jsonify({"error": "Formato no permitido. Use Excel (.xls, .xlsx), CSV (.csv, .csv.gz), Parquet o Arrow"}), 400
+    if not isinstance(total_size, int) or total_size <= 0 or total_size > UPLOAD_MAX_BYTES:
+        return jsonify({"error": f"total_size debe estar entre 1 y {UPLOAD_MAX_BYTES} bytes"}), 400
+    if kind not in ("upload", "update"):
+        return jsonify({"error": "kind debe ser 'upload' o 'update'"}), 400
+
+    session = create_session(user.id, kind, filename, total_size)
+    return jsonify({
+        **upload_session_status(session),
+        "chunk_url": f"/upload/sessions/{session.id}/chunks/<n>"
+    }), 201
+
+
+@upload.route("/sessions/<session_id>/chunks/<int:index>", methods=["PUT"])
+@jwt_required()
+def upload_session_chunk(session_id, index):
+    """Recibe una parte (cuerpo binario); se puede reenviar si la conexión se corta"""
+    session = get_upload_session(session_id)
+    if not session:
+        return jsonify({"error": "Subida no encontrada"}), 404
+    if session.status != "open":
+        return jsonify({"error": "La subida ya está completada"}), 409
+    if session_expired(session):
+        return jsonify({"error": "La subida ha caducado, hay que empezarla de nuevo"}), 410
+
+    try:
+        save_chunk(session, index, request.stream)
+    except ChunkError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(upload_session_status(session)), 200
+
+
+@upload.route("/sessions/<session_id>", methods=["GET"])
+@jwt_required()
+def get_upload_session_status(session_id):
+    """Rangos de bytes recibidos, para reanudar la subida"""
+    session = get_upload_session(session_id)
+    if not session:
+        return jsonify({"error": "Subida no encontrada"}), 404
+
+    return jsonify(upload_session_status(session)), 200
+
+
+@upload.route("/sessions/<session_id>/complete", methods=["POST"])
+@jwt_required()
+def complete_upload_session(session_id):
+    """Une las partes y encola la importación (responde 202 con el trabajo)"""
+    session = get_upload_session(session_id)
+    if not session:
+        return jsonify({"error": "Subida no encontrada"}), 404
+    if session.status != "open":
+        return jsonify({"error": "La subida ya está completada", "job_id": session.job_id}), 409
+    if session_expired(session):
+        return jsonify({"error": "La subida ha caducado, hay que empezarla de nuevo"}), 410
+
+    try:
+        job = complete_session(session)
+    except ChunkError as e:
+        return jsonify({"error": str(e), **upload_session_status(session)}), 400
+    if job is None:
+        return jsonify({"error": "La subida ya está completada", "job_id": session.job_id}), 409
+
+    submit_job(current_app._get_current_object(), job.id)
+    return jsonify({
+        "message": "Importación en cola",
+        "job": job.serialize(),
+        "status_url": f"/upload/jobs/{job.id}"
+    }), 202
+
+
+@upload.route("/sessions/<session_id>", methods=["DELETE"])
+@jwt_required()
+def cancel_upload_session(session_id):
+    """Cancela la subida y borra las partes recibidas"""
+    session = get_upload_session(session_id)
+    if not session:
+        return jsonify({"error": "Subida no encontrada"}), 404
+
+    remove_session_files(session)
+    db.session.delete(session)
+    db.session.commit()
+    return jsonify({"message": "Subida cancelada"}), 200
 
 
 # -------------ENDPOINT PARA DESCARGAR EL INVENTARIO DEL USUARIO----------------------------
 @upload.route("/download_inventory", methods=["GET"])
 @jwt_required()
 def download_user_inventory():
-    """Endpoint para descargar el inventario específico del usuario autenticado"""
+    """
+    Endpoint para descargar el inventario específico del usuario autenticado
+
+    ?format=xlsx (por defecto), csv o ndjson; ?gzip=1 comprime los formatos de texto;
+    ?async=1 genera la exportación en Tigris y responde 202 con el trabajo
+    """
     try:
         # Obtener el ID del usuario desde el token JWT
         user_id = get_jwt_identity()
 
-        # Verificar que el usuario existe
+        export_format = request.args.get("format", "xlsx").lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({"error": "Formato no soportado. Use xlsx, csv o ndjson"}), 400
+        compress = export_format != "xlsx" and request.args.get("gzip", "").lower() in ("1", "true", "yes")
+
+        # Verificar que el usuario existe (de paso trae la versión del inventario)
         user = User.query.get(user_id)
         if not user:
             return jsonify({"error": "Usuario no encontrado"}), 404
 
-        # Obtener todos los productos del usuario
-        productos = Productos.query.filter_by(user_id=user_id).all()
-
-        # Si no hay productos, devolver mensaje
-        if not productos:
-            return jsonify({"message": "No hay productos en tu inventario"}), 404
-
-        # Crear DataFrame con los productos del usuario
-        data = []
-        for producto in productos:
-            data.append({
-                'nombre_del_producto': producto.product_name,
-                'precio_por_unidad': producto.price_per_unit,
-                'descripción': producto.description,
-                'unidades': producto.quantity
-            })
+        # Exportación en segundo plano: se genera en Tigris y el trabajo
+        # devuelve una URL prefirmada cuando está lista
+        if wants_async():
+            job = create_job_for_path(
+                user.id, "export", export_filename(user.id, export_format, compress), None)
+            submit_job(current_app._get_current_object(), job.id)
+            return jsonify({
+                "message": "Exportación en cola",
+                "job": job.serialize(),
+                "status_url": f"/upload/jobs/{job.id}"
+            }), 202
+
+        mimetype, extension = EXPORT_FORMATS[export_format]
+        if compress:
+            mimetype, extension = "application/gzip", f"{extension}.gz"
+        headers = {
+            "Content-Disposition": f"attachment; filename=inventario_usuario_{user_id}.{extension}",
+            "Cache-Control": "private, no-cache"
+        }
 
-        df = pd.DataFrame(data)
+        # Mientras no cambie la versión del inventario el archivo es el mismo
+        key = export_key(user, export_format, compress)
+        if request.if_none_match.contains(key):
+            response = Response(status=304, headers=headers)
+            response.set_etag(key)
+            return response
 
-        # Crear el Excel en memoria
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False)
+        cached = export_cache.get(key)
+        if cached is not None:
+            response = Response(cached, mimetype=mimetype, headers=headers)
+            response.set_etag(key)
+            return response
 
-        # Preparar para enviar
-        output.seek(0)
+        # Si no hay productos, devolver mensaje
+        if not has_products(user.id):
+            return jsonify({"message": "No hay productos en tu inventario"}), 404
 
-        # Devolver el archivo Excel con el inventario del usuario
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=f"inventario_usuario_{user_id}.xlsx"
+        # El archivo se genera y se envía a la vez: las filas salen de un cursor
+        # de servidor por lotes, sin cargar el inventario en memoria
+        response = Response(
+            stream_with_context(iter_and_cache(
+                key, iter_inventory_export(user.id, export_format, compress))),
+            mimetype=mimetype,
+            headers=headers
         )
+        response.set_etag(key)
+        return response
 
     except Exception as e:
         error_traceback = traceback.format_exc()
@@ -223,25 +618,19 @@ def download_user_inventory():
 def download_template():
     """Endpoint para descargar una plantilla Excel vacía con las columnas requeridas"""
     try:
-        # Crear un DataFrame con las columnas requeridas pero sin datos
-        df = pd.DataFrame(
-            columns=['nombre_del_producto', 'precio_por_unidad', 'descripción', 'unidades'])
-
-        # Crear el Excel en memoria
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False)
-
-        # Preparar para enviar
-        output.seek(0)
-
-        # Devolver directamente desde la memoria
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name="plantilla_inventario.xlsx"
-        )
+        # La plantilla se genera una vez por proceso y se sirve desde memoria
+        data, etag = inventory_template()
+        headers = {
+            "Content-Disposition": "attachment; filename=plantilla_inventario.xlsx",
+            "Cache-Control": "private, max-age=86400"
+        }
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304, headers=headers)
+        else:
+            response = Response(data, mimetype=XLSX_MIMETYPE, headers=headers)
+        response.set_etag(etag)
+        return response
 
     except Exception as e:
         error_traceback = traceback.format_exc()
@@ -258,8 +647,8 @@ def download_template():
 @jwt_required()
 def update_inventory():
     """
-    Endpoint para actualizar el inventario existente desde un archivo Excel
-    sin eliminar los datos originales durante el proceso
+    Endpoint para actualizar el inventario existente desde un archivo Excel,
+    CSV o Parquet sin eliminar los datos originales durante el proceso
     """
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
@@ -270,85 +659,50 @@ def update_inventory():
         return jsonify({"error": "No se encontró archivo en la solicitud"}), 400
 
     file = request.files["file"]
-    if not file.filename.endswith((".xls", ".xlsx")):
-        return jsonify({"error": "Solo se permiten archivos Excel (.xls, .xlsx)"}), 400
-
-    file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-    file.save(file_path)
+    if not allowed_inventory_file(file.filename):
+        return jsonify({"error": "Formato no permitido. Use Excel (.xls, .xlsx), CSV (.csv, .csv.gz), Parquet o Arrow"}), 400
 
     try:
-        # Subir archivo a Tigris como respaldo, pero sin eliminar el anterior
-        file_url = upload_to_tigris_s3(file_path, f"update_{file.filename}")
-
-        # Leer el archivo Excel
-        df = pd.read_excel(file_path)
-
-        expected_columns = ['nombre_del_producto',
-                            'precio_por_unidad', 'descripción', 'unidades']
-        if not all(col in df.columns for col in expected_columns):
-            return jsonify({"error": "El archivo Excel no contiene las columnas esperadas"}), 400
-
-        df.columns = [col.lower().replace(' ', '_') for col in df.columns]
-        records = df.to_dict(orient="records")
-
-        # Obtener todos los productos actuales del usuario para comparación
-        existing_products = Productos.query.filter_by(user_id=user_id).all()
-        existing_product_names = {p.product_name: p for p in existing_products}
-
-        products_updated = 0
-        products_added = 0
-        low_stock_products = []
-
-        # Procesar cada registro del Excel
-        for record in records:
-            product_name = record['nombre_del_producto']
-            quantity = record['unidades']
-
-            # Si el producto ya existe, actualizarlo
-            if product_name in existing_product_names:
-                product = existing_product_names[product_name]
-                product.price_per_unit = record['precio_por_unidad']
-                product.description = record['descripción']
-                product.quantity = quantity
-                products_updated += 1
-            # Si no existe, crear uno nuevo
-            else:
-                new_product = Productos(
-                    product_name=product_name,
-                    price_per_unit=record['precio_por_unidad'],
-                    description=record['descripción'],
-                    quantity=quantity,
-                    user_id=user_id
-                )
-                db.session.add(new_product)
-                products_added += 1
-            
-            # Verificar si el producto tiene 5 o menos unidades
-            if quantity <= 5:
-                low_stock_products.append({
-                    'product_name': product_name,
-                    'quantity': quantity
-                })
-
-        # Guardar el archivo en la tabla de TigrisFiles
-        tigris_file = TigrisFiles(url=file_url, user_id=user_id)
-        db.session.add(tigris_file)
-        db.session.commit()
+        # Simulación: solo cabecera y primeras filas, sin guardar nada
+        if wants_dry_run():
+            return dry_run_inventory(user.id, file)
+    except InventoryFormatError as e:
+        return jsonify({"error": str(e)}), 400
 
-        # Limpiar archivo temporal
-        os.remove(file_path)
+    # Importación en segundo plano: la petición termina en milisegundos
+    if wants_async():
+        return enqueue_inventory_job(user_id, "update", file)
+
+    try:
+        # El archivo se procesa desde el stream de la subida, sin copiarlo
+        # a la carpeta de trabajo
+        tigris_file, stats = process_inventory_file(
+            user_id, file.stream, file.filename, "update")
+
+        if stats.get("duplicate"):
+            return jsonify({
+                "message": "Sin cambios: el archivo es idéntico al último inventario subido",
+                "file_id": tigris_file.id,
+                "file_status": tigris_file.status,
+                "stats": stats
+            })
 
         return jsonify({
-            "message": f"Inventario actualizado: {products_updated} productos actualizados, {products_added} productos añadidos. {len(low_stock_products)} con stock bajo.",
-            "file_url": file_url
+            "message": f"Inventario actualizado: {stats['updated']} productos actualizados, {stats['added']} productos añadidos, {stats['unchanged']} sin cambios. {stats['low_stock']} con stock bajo.",
+            "file_id": tigris_file.id,
+            "file_status": tigris_file.status,
+            "stats": stats
         })
 
+    except InventoryValidationError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e), "validation": e.report}), 400
+    except InventoryFormatError as e:
+        db.session.rollback()
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
 
 
 # -------ENDPOINT PARA ELIMINAR EL INVENTARIO DE TIGRIS-------------------------------
@@ -403,6 +757,7 @@ def delete_product(product_id):
 
         # Eliminar el producto
         db.session.delete(product)
+        bump_inventory_version(user_id)
         db.session.commit()
 
         return jsonify({
@@ -456,10 +811,11 @@ def update_product(product_id):
             new_quantity = int(data['quantity'])
             product.quantity = new_quantity
 
-        if 'image_url' in data:
-            product.image_url = data['image_url']
+        if 'image_object_key' in data or 'image_url' in data:
+            product.image_url, product.image_object_key = product_image_fields(data)
 
         # Guardar los cambios
+        bump_inventory_version(user_id)
         db.session.commit()
 
         return jsonify({
@@ -513,17 +869,20 @@ def add_product():
             return jsonify({"error": "Formato incorrecto para precio o cantidad"}), 400
         
         # Crear el nuevo producto
+        image_url, image_object_key = product_image_fields(data)
         new_product = Productos(
             product_name=data['product_name'],
             price_per_unit=price,
             description=data.get('description', ''),
             quantity=quantity,
-            image_url=data.get('image_url', ''),
+            image_url=image_url,
+            image_object_key=image_object_key,
             user_id=user_id
         )
         
         # Guardar el nuevo producto 
         db.session.add(new_product)
+        bump_inventory_version(user.id)
         db.session.commit()
         
     
@@ -550,8 +909,8 @@ def get_user_products():
         # Buscar productos del usuario actual
         products = Productos.query.filter_by(user_id=user_id).all()
 
-        # Serializar los resultados
-        products_serialized = [product.serialize() for product in products]
+        # Serializar los resultados (las imágenes se firman todas de una vez)
+        products_serialized = Productos.serialize_many(products)
 
         return jsonify({"productos": products_serialized}), 200
 
@@ -563,7 +922,12 @@ def get_user_products():
 @upload.route("/upload-product-image", methods=['POST'])
 @jwt_required()
 def upload_product_image():
-    """Sube una imagen para un producto y devuelve la URL"""
+    """
+    Sube una imagen para un producto y devuelve la URL y la clave
+
+    Las miniaturas (WebP/AVIF) se generan después en segundo plano; aparecen
+    en Productos.serialize cuando están listas.
+    """
     user_id = get_jwt_identity()
 
     if "image" not in request.files:
@@ -580,13 +944,26 @@ def upload_product_image():
         ext = filename.rsplit('.', 1)[1].lower()
         unique_filename = f"product_{user_id}_{uuid.uuid4().hex}.{ext}"
 
-        # Subir a Tigris
+        # Copia privada: el original se sube ya y las variantes salen de la
+        # misma copia en segundo plano (el stream se cierra al responder)
+        data, _ = spool_copy(file.stream)
         try:
+            object_key = make_object_key(unique_filename, 'product-images')
             url = upload_to_tigris_s3(
-                file.read(), unique_filename, 'product-images')
+                data, unique_filename,
+                content_type=mimetypes.guess_type(filename)[0] or 'image/jpeg',
+                object_key=object_key)
 
-            return jsonify({"url": url}), 200
+            image = ProductImage(object_key=object_key, user_id=user_id)
+            db.session.add(image)
+            db.session.commit()
+            start_variants(current_app._get_current_object(), data, object_key, image.id)
+
+            # El producto debe guardar la clave (image_object_key): la URL caduca
+            return jsonify({"url": url, "object_key": object_key}), 200
         except Exception as e:
+            data.close()
+            db.session.rollback()
             return jsonify({"error": str(e)}), 500
 
     return jsonify({"error": "Tipo de archivo no permitido"}), 400
@@ -607,11 +984,14 @@ def get_current_inventory_info():
         if not latest_file:
             return jsonify({"message": "No se encontró ningún inventario"}), 404
 
-        # Extraer el nombre del archivo de la URL
+        # Extraer el nombre del archivo de la clave (o de la URL en registros antiguos)
         from urllib.parse import urlparse, unquote
 
-        url_path = urlparse(latest_file.url).path
-        filename = os.path.basename(unquote(url_path))
+        if latest_file.object_key:
+            filename = os.path.basename(latest_file.object_key)
+        else:
+            url_path = urlparse(latest_file.url or "").path
+            filename = os.path.basename(unquote(url_path))
 
         # Si el nombre tiene timestamp, intentar extraerlo
         timestamp_match = re.search(r'(\d{14})_', filename)
@@ -628,7 +1008,8 @@ def get_current_inventory_info():
         inventory_info = {
             "id": latest_file.id,
             "name": filename,
-            "url": latest_file.url,
+            "url": latest_file.get_url(),
+            "status": latest_file.status,
             "last_updated": last_updated
         }
 
@@ -1,7 +1,7 @@
   
 import os
 from flask_admin import Admin
-from .models import db, User, Rol, Cart, Stock, Productos, TigrisFiles, Facturas, Detalles_Facturas, Logo
+from .models import db, User, Rol, Cart, Stock, Productos, TigrisFiles, InventoryJob, UploadSession, ProductImage, Facturas, Detalles_Facturas, Logo
 from flask_admin.contrib.sqla import ModelView
 
 def setup_admin(app):
@@ -17,6 +17,9 @@ def setup_admin(app):
     admin.add_view(ModelView(Stock, db.session))
     admin.add_view(ModelView(Productos, db.session))
     admin.add_view(ModelView(TigrisFiles, db.session))
+    admin.add_view(ModelView(InventoryJob, db.session))
+    admin.add_view(ModelView(UploadSession, db.session))
+    admin.add_view(ModelView(ProductImage, db.session))
     admin.add_view(ModelView(Facturas, db.session))
     admin.add_view(ModelView(Detalles_Facturas, db.session))
     admin.add_view(ModelView(Logo, db.session))
@@ -1,6 +1,10 @@
 
 import click
+import time
 from api.models import db, User
+from api.service.import_jobs import run_job, next_pending_job_id, reap_jobs
+from api.service.chunked_upload import expire_sessions
+from api.service.storage import check_bucket, INVENTORY_BUCKET, LOGO_BUCKET
 
 """
 In this file, you can add as many commands as you want using the @app.cli.command decorator
@@ -31,4 +35,50 @@ def setup_commands(app):
 
     @app.cli.command("insert-test-data")
     def insert_test_data():
-        pass
\ No newline at end of file
+        pass
+
+    """
+    Worker de importaciones de inventario: procesa los trabajos pendientes
+    creados con ?async=1. Usar junto con IMPORT_JOBS_MODE=cli
+    $ flask import-worker            (se queda esperando nuevos trabajos)
+    $ flask import-worker --once     (procesa los pendientes y termina)
+    """
+    @app.cli.command("import-worker")
+    @click.option("--once", is_flag=True, help="Terminar cuando no queden trabajos pendientes")
+    @click.option("--interval", default=2.0, help="Segundos entre consultas cuando no hay trabajos")
+    def import_worker(once, interval):
+        print("Worker de importaciones iniciado")
+        last_reap = None
+        while True:
+            # Trabajos interrumpidos por un reinicio, archivos huérfanos y
+            # subidas por partes abandonadas
+            if last_reap is None or time.monotonic() - last_reap > 60:
+                reap_jobs()
+                expire_sessions()
+                last_reap = time.monotonic()
+
+            job_id = next_pending_job_id()
+            db.session.rollback()
+            if job_id is None:
+                if once:
+                    break
+                time.sleep(interval)
+                continue
+
+            print(f"Procesando trabajo de importación {job_id}")
+            run_job(job_id)
+            db.session.remove()
+
+        print("No quedan trabajos pendientes")
+
+    """
+    Comprueba (y crea si no existen) los buckets de Tigris. Pensado para el
+    despliegue: después se puede arrancar con STORAGE_BUCKETS_READY=1 y las
+    subidas no vuelven a comprobar los buckets.
+    $ flask ensure-buckets
+    """
+    @app.cli.command("ensure-buckets")
+    def ensure_buckets():
+        for bucket_name in (INVENTORY_BUCKET, LOGO_BUCKET):
+            check_bucket(bucket_name)
+            print(f"Bucket {bucket_name} listo")
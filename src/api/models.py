@@ -1,9 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import String, Column, Integer, Float, Boolean, ForeignKey, LargeBinary
+from sqlalchemy import String, Column, Integer, BigInteger, Float, Boolean, ForeignKey, LargeBinary, DateTime, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from werkzeug.security import generate_password_hash, check_password_hash
 from typing import Optional
 from datetime import datetime
+from api.service.storage import INVENTORY_BUCKET, LOGO_BUCKET
+from api.service.presign import presigned_url, presigned_urls, object_key_from_url
 
 db = SQLAlchemy()
 
@@ -21,6 +23,9 @@ class User(db.Model):
         "password", String(128), nullable=False)
     is_active: Mapped[bool] = mapped_column(
         Boolean(), nullable=False, default=False)
+    # Sube con cada cambio en sus productos (ETag y caché de las exportaciones)
+    inventory_version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0")
 
     # PROPIEDADES PARA MANEJAR LA CONTRASEÑA DE FORMA SEGURA
     @property
@@ -44,6 +49,9 @@ class User(db.Model):
     # AÑADIMOS RELACIONES (A PRODUCTOS Y A TIGRIS FILES)
     products = relationship("Productos", back_populates="user")
     tigris_files = relationship("TigrisFiles", back_populates="user")
+    inventory_jobs = relationship("InventoryJob", back_populates="user")
+    upload_sessions = relationship("UploadSession", back_populates="user")
+    product_images = relationship("ProductImage", back_populates="user")
 
     # Relación uno a muchos con Logo, la tabla muchos
     logo = relationship("Logo", back_populates="user")
@@ -189,6 +197,12 @@ class Stock(db.Model):
 
 
 class Productos(db.Model):
+    # Un usuario no puede tener dos productos con el mismo nombre (clave de los upserts)
+    __table_args__ = (
+        db.Index('ix_productos_user_id_product_name',
+                 'user_id', 'product_name', unique=True),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
     product_name: Mapped[str] = mapped_column(String(120), nullable=False)
     price_per_unit: Mapped[float] = mapped_column(Float, nullable=False)
@@ -196,6 +210,8 @@ class Productos(db.Model):
     quantity: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     image_url: Mapped[str] = mapped_column(
         String(500), nullable=False, default="https://placehold.co/600x400/EEE/31343C")
+    # Clave de la imagen en Tigris (si es nuestra): la URL se firma al leer
+    image_object_key: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
 
     # RELACION UNO A MUCHOS CON DETALLES_FACTURA, LA TABLA DE MUCHOS
     factura_detalles = relationship("Detalles_Facturas", back_populates="prod")
@@ -206,8 +222,18 @@ class Productos(db.Model):
     
     cart_product = relationship("Cart", back_populates="product")
 
+    # Variantes (miniaturas) de la imagen subida, si ya se generaron
+    image = relationship(
+        "ProductImage",
+        primaryjoin="foreign(Productos.image_object_key) == ProductImage.object_key",
+        viewonly=True, lazy="selectin")
 
-    def serialize(self):
+
+    def serialize(self, image_urls=None):
+        if image_urls is None:
+            image_urls = presigned_urls(INVENTORY_BUCKET, self.image_keys())
+        image_variants = self.get_image_variants(image_urls)
+        webp = image_variants.get("webp", {})
         return {
             "id": self.id,
             "product_name": self.product_name,
@@ -215,13 +241,105 @@ class Productos(db.Model):
             "description": self.description,
             "quantity": self.quantity,
             "user_id": self.user_id,
-            "image_url": self.image_url
+            "image_url": self.get_image_url(image_urls),
+            # Miniatura más pequeña para las tarjetas (None mientras no exista)
+            "image_thumbnail_url": webp[min(webp, key=int)] if webp else None,
+            "image_variants": image_variants
+        }
+
+    @staticmethod
+    def serialize_many(products):
+        """Serializa una lista de productos firmando todas sus imágenes de una vez"""
+        image_urls = presigned_urls(
+            INVENTORY_BUCKET, [key for product in products for key in product.image_keys()])
+        return [product.serialize(image_urls) for product in products]
+
+    def get_image_object_key(self):
+        """
+        Clave de la imagen en el bucket; los productos anteriores a
+        image_object_key solo guardan la URL prefirmada (ya caducada), de la
+        que se saca la clave
+        """
+        return self.image_object_key or object_key_from_url(self.image_url, INVENTORY_BUCKET)
+
+    def image_keys(self):
+        """Claves de la imagen y de sus variantes en el bucket"""
+        object_key = self.get_image_object_key()
+        keys = [object_key] if object_key else []
+        if self.image and self.image.variants:
+            keys.extend(key for widths in self.image.variants.values() for key in widths.values())
+        return keys
+
+    def get_image_variants(self, image_urls):
+        """URLs firmadas de las variantes: {formato: {ancho: URL}}"""
+        if not (self.image and self.image.variants):
+            return {}
+        return {
+            image_format: {width: image_urls[key] for width, key in widths.items()}
+            for image_format, widths in self.image.variants.items()
+        }
+
+    def get_image_url(self, image_urls=None):
+        """
+        URL prefirmada de la imagen en Tigris, o la URL externa guardada
+
+        Args:
+            image_urls: URLs ya firmadas por clave (ver serialize_many)
+        """
+        object_key = self.get_image_object_key()
+        if object_key:
+            if image_urls and object_key in image_urls:
+                return image_urls[object_key]
+            return presigned_url(INVENTORY_BUCKET, object_key)
+        return self.image_url
+
+
+# TABLA DE IMÁGENES DE PRODUCTO (LAS VARIANTES SE GENERAN EN SEGUNDO PLANO)
+
+
+class ProductImage(db.Model):
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # Clave del original en el bucket (Productos.image_object_key)
+    object_key: Mapped[str] = mapped_column(String(500), unique=True, nullable=False)
+    # pending -> done / failed
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending")
+    # {formato: {ancho: clave}}, ver api.service.image_variants
+    variants: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=datetime.utcnow)
+
+    # AÑADIMOS LA RELACION CON EL USUARIO
+    user_id: Mapped[int] = mapped_column(ForeignKey('user.id'), nullable=False)
+    user = relationship("User", back_populates="product_images")
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "object_key": self.object_key,
+            "status": self.status,
+            "variants": self.variants,
+            "user_id": self.user_id
         }
 
 
 class TigrisFiles(db.Model):
+    __table_args__ = (
+        db.Index('ix_tigris_files_user_id_content_sha256',
+                 'user_id', 'content_sha256'),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True)
-    url: Mapped[str] = mapped_column(String(500), nullable=False)
+    # Solo en registros antiguos: ahora se guarda la clave y la URL se firma al leer
+    url: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    object_key: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    # pending -> stored / failed
+    status: Mapped[str] = mapped_column(
+        String(20), nullable=False, default="stored", server_default="stored")
+    # SHA-256 del contenido, para no reprocesar subidas idénticas
+    content_sha256: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    # Versión del inventario del usuario justo después de esta importación:
+    # si ha cambiado desde entonces, volver a subir el mismo archivo no es un duplicado
+    inventory_version: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
 
     # AÑADIMOS LA RELACION CON EL USUARIO
     user_id: Mapped[int] = mapped_column(ForeignKey('user.id'), nullable=False)
@@ -230,7 +348,96 @@ class TigrisFiles(db.Model):
     def serialize_tigris(self):
         return {
             "id": self.id,
-            "tigris_url": self.url,
+            "tigris_url": self.get_url(),
+            "object_key": self.object_key,
+            "status": self.status,
+            "content_sha256": self.content_sha256,
+            "user_id": self.user_id
+        }
+
+    def get_url(self):
+        """URL prefirmada del archivo una vez subido (None mientras no lo está)"""
+        # Los registros anteriores a object_key solo guardan la URL prefirmada (ya caducada)
+        object_key = self.object_key or object_key_from_url(self.url, INVENTORY_BUCKET)
+        if object_key:
+            return presigned_url(INVENTORY_BUCKET, object_key) if self.status == "stored" else None
+        return self.url
+
+# TABLA DE TRABAJOS DE IMPORTACIÓN (SE PROCESAN EN SEGUNDO PLANO)
+
+
+class InventoryJob(db.Model):
+    id: Mapped[int] = mapped_column(primary_key=True)
+    # "upload" (cargar inventario), "update" (actualizar inventario) o
+    # "export" (exportación a Tigris; filename indica formato y compresión)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)
+    # pending -> running -> done / failed
+    status: Mapped[str] = mapped_column(
+        String(20), nullable=False, default="pending", index=True)
+    filename: Mapped[str] = mapped_column(String(255), nullable=False)
+    file_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    rows_processed: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    rows_per_sec: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    result: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(String(1000), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=datetime.utcnow)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    # AÑADIMOS LA RELACION CON EL USUARIO
+    user_id: Mapped[int] = mapped_column(ForeignKey('user.id'), nullable=False)
+    user = relationship("User", back_populates="inventory_jobs")
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "filename": self.filename,
+            "rows_processed": self.rows_processed,
+            "rows_per_sec": self.rows_per_sec,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "user_id": self.user_id
+        }
+
+
+# TABLA DE SUBIDAS POR PARTES (REANUDABLES)
+class UploadSession(db.Model):
+    # Identificador aleatorio: aparece en las URLs de las partes
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    # "upload" (cargar inventario) o "update" (actualizar inventario)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)
+    # open -> completed (las abiertas caducan, ver UPLOAD_SESSION_TTL_SECONDS)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="open")
+    filename: Mapped[str] = mapped_column(String(255), nullable=False)
+    total_size: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    chunk_size: Mapped[int] = mapped_column(Integer, nullable=False)
+    # Trabajo de importación creado al completar la subida
+    job_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey('inventory_job.id'), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, nullable=False, default=datetime.utcnow)
+
+    # AÑADIMOS LA RELACION CON EL USUARIO
+    user_id: Mapped[int] = mapped_column(ForeignKey('user.id'), nullable=False)
+    user = relationship("User", back_populates="upload_sessions")
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "filename": self.filename,
+            "total_size": self.total_size,
+            "chunk_size": self.chunk_size,
+            "total_chunks": -(-self.total_size // self.chunk_size),
+            "job_id": self.job_id,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
             "user_id": self.user_id
         }
 
@@ -279,6 +486,8 @@ class Logo(db.Model):
     id: Mapped[int] = mapped_column(primary_key=True)
     logo_url: Mapped[str] = mapped_column(
         String(500), nullable=True, default="https://placehold.co/600x400/EEE/31343C")
+    # Clave del logo subido a Tigris: la URL se firma al leer
+    object_key: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
 
     image_data: Mapped[Optional[bytes]] = mapped_column(
         LargeBinary, nullable=True)
@@ -290,7 +499,15 @@ class Logo(db.Model):
     def serialize(self):
         return {
             "id": self.id,
-            "logo_url": self.logo_url,
+            "logo_url": self.get_logo_url(),
             "user_id": self.user_id
         }
 
+    def get_logo_url(self):
+        """URL prefirmada del logo en Tigris, o la URL guardada (por defecto)"""
+        # Los logos anteriores a object_key solo guardan la URL prefirmada (ya caducada)
+        object_key = self.object_key or object_key_from_url(self.logo_url, LOGO_BUCKET)
+        if object_key:
+            return presigned_url(LOGO_BUCKET, object_key)
+        return self.logo_url
+
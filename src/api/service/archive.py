@@ -0,0 +1,100 @@
+# En api/service/archive.py
+import os
+import time
+import random
+import hashlib
+import traceback
+from tempfile import SpooledTemporaryFile
+from sqlalchemy import update
+from api.models import db, TigrisFiles
+from api.utils import UPLOAD_SPOOL_MAX_BYTES
+from api.service.inventory_import import open_source
+from api.service.executors import get_executor
+
+# Hilos que suben los archivos de inventario a Tigris en segundo plano
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", 4))
+
+# Reintentos de la subida con espera exponencial (1s, 2s, 4s... + aleatorio)
+ARCHIVE_MAX_ATTEMPTS = int(os.getenv("ARCHIVE_MAX_ATTEMPTS", 5))
+ARCHIVE_BACKOFF_SECONDS = float(os.getenv("ARCHIVE_BACKOFF_SECONDS", 1))
+
+
+def _upload_with_retry(upload_fn, data, file_name, object_key, content_type):
+    """Sube el archivo reintentando con espera exponencial. Devuelve la URL"""
+    try:
+        for attempt in range(1, ARCHIVE_MAX_ATTEMPTS + 1):
+            try:
+                data.seek(0)
+                return upload_fn(data, file_name, content_type=content_type, object_key=object_key)
+            except Exception as e:
+                if attempt == ARCHIVE_MAX_ATTEMPTS:
+                    raise
+                delay = ARCHIVE_BACKOFF_SECONDS * 2 ** (attempt - 1)
+                delay += random.uniform(0, ARCHIVE_BACKOFF_SECONDS)
+                print(f"Error al archivar {object_key} (intento {attempt}): {str(e)}. Reintento en {delay:.1f}s")
+                time.sleep(delay)
+    finally:
+        data.close()
+
+
+def spool_copy(source):
+    """
+    Copia el archivo a un buffer privado (en memoria o en un temporal si es muy
+    grande) calculando su SHA-256 en la misma pasada
+
+    La copia es necesaria porque el stream de la petición se cierra al responder.
+
+    Returns:
+        Tupla (copia, sha256 en hexadecimal)
+    """
+    data = SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES, mode="w+b")
+    digest = hashlib.sha256()
+    with open_source(source) as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+            data.write(block)
+    data.seek(0)
+    return data, digest.hexdigest()
+
+
+def start_archive(upload_fn, data, file_name, object_key, content_type):
+    """
+    Empieza a subir el archivo a Tigris mientras se procesa la importación
+
+    Args:
+        upload_fn: Función que sube el archivo (upload_to_tigris_s3)
+        data: Copia privada del archivo (ver spool_copy); se cierra al terminar
+        file_name: Nombre con el que se archiva
+        object_key: Clave del objeto en el bucket
+        content_type: Tipo de contenido del archivo
+
+    Returns:
+        Future con la URL del archivo cuando termina la subida
+    """
+    return get_executor("archive", ARCHIVE_WORKERS).submit(
+        _upload_with_retry, upload_fn, data, file_name, object_key, content_type)
+
+
+def finish_archive(app, future, tigris_file_id):
+    """
+    Cuando termina la subida, pasa el registro de TigrisFiles de "pending" a
+    "stored" o a "failed". Se llama después del commit. La URL no se guarda:
+    se firma al leer a partir de la clave del objeto.
+    """
+    def on_done(done):
+        try:
+            done.result()
+            values = {"status": "stored"}
+        except Exception as e:
+            print(f"No se pudo archivar el archivo {tigris_file_id}: {str(e)}")
+            print(traceback.format_exc())
+            values = {"status": "failed"}
+
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(
+                    update(TigrisFiles.__table__)
+                    .where(TigrisFiles.__table__.c.id == tigris_file_id)
+                    .values(**values))
+
+    future.add_done_callback(on_done)
@@ -0,0 +1,238 @@
+# En api/service/bulk_insert.py
+import csv
+import io
+import time
+from sqlalchemy import select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from api.models import db, Productos
+from api.service.inventory_import import iter_chunks, IMPORT_CHUNK_SIZE
+
+# Columnas que se rellenan en cada inserción masiva
+PRODUCT_COLUMNS = ['product_name', 'price_per_unit',
+                   'description', 'quantity', 'image_url', 'user_id']
+
+# Columnas que se sobrescriben cuando el producto ya existe
+UPDATE_COLUMNS = ['price_per_unit', 'description', 'quantity']
+
+# Tabla temporal de PostgreSQL donde se cargan los bloques antes del upsert
+STAGING_TABLE = "productos_staging"
+STAGING_DDL = f"""
+    CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+        product_name VARCHAR(120),
+        price_per_unit DOUBLE PRECISION,
+        description VARCHAR(500),
+        quantity INTEGER,
+        image_url VARCHAR(500),
+        user_id INTEGER
+    ) ON COMMIT DROP
+"""
+UPSERT_SQL = f"""
+    WITH upserted AS (
+        INSERT INTO productos ({', '.join(PRODUCT_COLUMNS)})
+        SELECT {', '.join(PRODUCT_COLUMNS)} FROM {STAGING_TABLE}
+        ON CONFLICT (user_id, product_name) DO UPDATE SET
+            {', '.join(f"{col} = EXCLUDED.{col}" for col in UPDATE_COLUMNS)}
+        WHERE ({', '.join(f"productos.{col}" for col in UPDATE_COLUMNS)})
+            IS DISTINCT FROM ({', '.join(f"EXCLUDED.{col}" for col in UPDATE_COLUMNS)})
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted)
+    FROM upserted
+"""
+
+# COPY no aplica los valores por defecto de SQLAlchemy, así que se envían explícitos
+DEFAULT_IMAGE_URL = Productos.__table__.c.image_url.default.arg
+
+
+def record_to_row(record, user_id):
+    """Convierte una fila del archivo de inventario en una fila de la tabla productos"""
+    return {
+        'product_name': record['nombre_del_producto'],
+        'price_per_unit': record['precio_por_unidad'],
+        'description': record['descripción'],
+        'quantity': record['unidades'],
+        'image_url': DEFAULT_IMAGE_URL,
+        'user_id': user_id
+    }
+
+
+def uses_copy(connection):
+    """COPY FROM STDIN solo está disponible con PostgreSQL y psycopg2"""
+    return connection.dialect.name == 'postgresql' and connection.dialect.driver == 'psycopg2'
+
+
+def copy_rows(connection, table_name, columns, rows):
+    """
+    Envía un bloque de filas con COPY FROM STDIN en formato CSV
+
+    Args:
+        connection: Conexión de SQLAlchemy (dentro de la transacción de la sesión)
+        table_name: Tabla de destino
+        columns: Columnas en el orden en el que se escriben
+        rows: Lista de diccionarios con esas columnas
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[col] for col in columns])
+    buffer.seek(0)
+
+    # En CSV los campos vacíos sin comillas se interpretan como NULL
+    sql = f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(sql, buffer)
+    finally:
+        cursor.close()
+
+
+def _dedupe_by_name(rows):
+    """Si un nombre se repite dentro del bloque gana la última fila"""
+    return list({row['product_name']: row for row in rows}.values())
+
+
+def _upsert_postgres(connection, rows):
+    """
+    Upsert de un bloque en PostgreSQL: las filas se cargan en una tabla
+    temporal y se mezclan con un solo INSERT ... ON CONFLICT DO UPDATE
+
+    Returns:
+        Tupla (añadidos, actualizados) calculada con RETURNING
+    """
+    connection.execute(text(STAGING_DDL))
+    connection.execute(text(f"TRUNCATE {STAGING_TABLE}"))
+
+    if uses_copy(connection):
+        copy_rows(connection, STAGING_TABLE, PRODUCT_COLUMNS, rows)
+    else:
+        placeholders = ', '.join(f":{col}" for col in PRODUCT_COLUMNS)
+        connection.execute(
+            text(f"INSERT INTO {STAGING_TABLE} ({', '.join(PRODUCT_COLUMNS)}) VALUES ({placeholders})"),
+            rows)
+
+    # xmax = 0 solo en las filas recién insertadas; las filas sin cambios no
+    # pasan el WHERE del DO UPDATE, no se escriben y no aparecen en RETURNING
+    added, updated = connection.execute(text(UPSERT_SQL)).one()
+    return added, updated
+
+
+def _current_values(connection, rows, user_id):
+    """Valores actuales (UPDATE_COLUMNS) de los productos del bloque, por nombre"""
+    table = Productos.__table__
+    names = [row['product_name'] for row in rows]
+    return {
+        name: values for name, *values in connection.execute(
+            select(table.c.product_name, *(table.c[col] for col in UPDATE_COLUMNS))
+            .where(table.c.user_id == user_id, table.c.product_name.in_(names)))
+    }
+
+
+def _upsert_sqlite(connection, rows, user_id):
+    """
+    Upsert de un bloque en SQLite con INSERT ... ON CONFLICT DO UPDATE
+
+    SQLite no devuelve qué filas se insertaron o cambiaron, así que se leen
+    antes los valores actuales de los nombres del bloque y solo se envían
+    las filas nuevas o con cambios.
+
+    Returns:
+        Tupla (añadidos, actualizados)
+    """
+    table = Productos.__table__
+    current = _current_values(connection, rows, user_id)
+
+    changed = [row for row in rows
+               if current.get(row['product_name']) != [row[col] for col in UPDATE_COLUMNS]]
+    if not changed:
+        return 0, 0
+
+    stmt = sqlite_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.product_name],
+        set_={col: stmt.excluded[col] for col in UPDATE_COLUMNS}
+    )
+    connection.execute(stmt, changed)
+
+    updated = sum(1 for row in changed if row['product_name'] in current)
+    return len(changed) - updated, updated
+
+
+def upsert_productos(records, user_id, chunk_size=IMPORT_CHUNK_SIZE, on_progress=None):
+    """
+    Inserta o actualiza productos por bloques usando la clave (user_id, product_name)
+
+    Usa COPY + INSERT ... ON CONFLICT en PostgreSQL y ON CONFLICT con
+    executemany en SQLite. Solo se escriben las filas nuevas o que cambian
+    respecto al inventario actual. No hace commit: las filas quedan en la
+    transacción de db.session.
+
+    Args:
+        records: Iterable de filas del archivo (ver records_from_frames)
+        user_id: Usuario propietario de los productos
+        chunk_size: Filas por bloque
+        on_progress: Función opcional que recibe las filas procesadas tras cada bloque
+
+    Returns:
+        Diccionario con añadidos, actualizados, sin cambios, segundos y
+        filas/segundo
+    """
+    connection = db.session.connection()
+    postgres = connection.dialect.name == 'postgresql'
+
+    added = 0
+    updated = 0
+    unchanged = 0
+    start = time.perf_counter()
+
+    for chunk in iter_chunks(records, chunk_size):
+        rows = _dedupe_by_name(record_to_row(record, user_id) for record in chunk)
+
+        if postgres:
+            chunk_added, chunk_updated = _upsert_postgres(connection, rows)
+        else:
+            chunk_added, chunk_updated = _upsert_sqlite(connection, rows, user_id)
+
+        added += chunk_added
+        updated += chunk_updated
+        unchanged += len(rows) - chunk_added - chunk_updated
+
+        if on_progress:
+            on_progress(added + updated + unchanged)
+
+    rows_processed = added + updated + unchanged
+    seconds = time.perf_counter() - start
+    rows_per_sec = round(rows_processed / seconds) if seconds > 0 else rows_processed
+
+    print(f"Upsert masivo: {added} añadidos, {updated} actualizados, {unchanged} sin cambios en {seconds:.2f}s ({rows_per_sec} filas/s)")
+
+    return {
+        "added": added,
+        "updated": updated,
+        "unchanged": unchanged,
+        "seconds": round(seconds, 3),
+        "rows_per_sec": rows_per_sec
+    }
+
+
+def predict_changes(records, user_id):
+    """
+    Calcula qué haría upsert_productos con estas filas sin escribir nada
+
+    Args:
+        records: Filas del archivo (ver records_from_frames)
+        user_id: Usuario propietario de los productos
+
+    Returns:
+        Diccionario con añadidos, actualizados y sin cambios
+    """
+    rows = _dedupe_by_name(record_to_row(record, user_id) for record in records)
+    current = _current_values(db.session.connection(), rows, user_id)
+
+    added = sum(1 for row in rows if row['product_name'] not in current)
+    unchanged = sum(1 for row in rows
+                    if current.get(row['product_name']) == [row[col] for col in UPDATE_COLUMNS])
+    return {
+        "added": added,
+        "updated": len(rows) - added - unchanged,
+        "unchanged": unchanged
+    }
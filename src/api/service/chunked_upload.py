@@ -0,0 +1,243 @@
+# En api/service/chunked_upload.py
+import os
+import uuid
+import shutil
+import datetime
+from sqlalchemy import update, delete
+from api.models import db, UploadSession
+from api.service.import_jobs import job_file_path, create_job_for_path
+
+# Carpeta donde se guardan las partes hasta completar la subida
+UPLOAD_SESSIONS_FOLDER = os.getenv(
+    "UPLOAD_SESSIONS_FOLDER", os.path.join("upload", "sessions"))
+
+# Tamaño de cada parte (todas menos la última) y tamaño máximo del archivo
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 1024 * 1024 * 1024))
+
+# Una subida abierta desde hace más de esto se da por abandonada y se borra
+# junto con sus partes (ver expire_sessions)
+UPLOAD_SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_SECONDS", 24 * 3600))
+
+
+class ChunkError(ValueError):
+    """La parte no corresponde a la subida (índice o tamaño incorrectos)"""
+
+
+def _session_folder(session):
+    return os.path.join(UPLOAD_SESSIONS_FOLDER, session.id)
+
+
+def _chunk_path(session, index):
+    return os.path.join(_session_folder(session), f"{index:06d}.part")
+
+
+def total_chunks(session):
+    """Número de partes de la subida (división redondeando hacia arriba)"""
+    return -(-session.total_size // session.chunk_size)
+
+
+def expected_chunk_size(session, index):
+    """Tamaño que debe tener la parte `index` (la última puede ser menor)"""
+    start = index * session.chunk_size
+    return min(session.chunk_size, session.total_size - start)
+
+
+def session_expires_at(session):
+    """Momento (UTC) a partir del cual la subida abierta se da por abandonada"""
+    return session.created_at + datetime.timedelta(seconds=UPLOAD_SESSION_TTL_SECONDS)
+
+
+def session_expired(session):
+    """La subida sigue abierta pero ha pasado su UPLOAD_SESSION_TTL_SECONDS"""
+    return session.status == "open" and datetime.datetime.utcnow() >= session_expires_at(session)
+
+
+def create_session(user_id, kind, filename, total_size):
+    """
+    Registra una subida por partes
+
+    Args:
+        user_id: Usuario que sube el inventario
+        kind: "upload" o "update"
+        filename: Nombre original del archivo
+        total_size: Tamaño total en bytes
+
+    Returns:
+        El UploadSession creado (ya guardado en la base de datos)
+    """
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        status="open",
+        filename=filename,
+        total_size=total_size,
+        chunk_size=UPLOAD_CHUNK_SIZE,
+        user_id=user_id
+    )
+    db.session.add(session)
+    db.session.commit()
+    os.makedirs(_session_folder(session), exist_ok=True)
+    return session
+
+
+def save_chunk(session, index, stream):
+    """
+    Guarda una parte leyendo el cuerpo de la petición por bloques
+
+    La parte se escribe en un temporal y se renombra al final, así una
+    conexión cortada nunca deja una parte a medias. Reenviar una parte
+    la sobrescribe.
+
+    Raises:
+        ChunkError: Si el índice no existe o el tamaño no es el esperado
+    """
+    if index < 0 or index >= total_chunks(session):
+        raise ChunkError(f"La parte {index} no existe (0-{total_chunks(session) - 1})")
+
+    expected = expected_chunk_size(session, index)
+    final_path = _chunk_path(session, index)
+    temp_path = f"{final_path}.{uuid.uuid4().hex}.tmp"
+
+    os.makedirs(_session_folder(session), exist_ok=True)
+    written = 0
+    try:
+        with open(temp_path, "wb") as f:
+            for block in iter(lambda: stream.read(1024 * 1024), b""):
+                written += len(block)
+                if written > expected:
+                    break
+                f.write(block)
+        if written != expected:
+            raise ChunkError(
+                f"La parte {index} debe tener {expected} bytes")
+        os.replace(temp_path, final_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def received_chunks(session):
+    """Índices de las partes recibidas, ordenados"""
+    folder = _session_folder(session)
+    if not os.path.isdir(folder):
+        return []
+    return sorted(int(name.split(".")[0]) for name in os.listdir(folder)
+                  if name.endswith(".part"))
+
+
+def received_ranges(session):
+    """
+    Rangos de bytes recibidos, unidos cuando son contiguos
+
+    Returns:
+        Lista de [inicio, fin] (ambos incluidos), como en Content-Range
+    """
+    ranges = []
+    for index in received_chunks(session):
+        start = index * session.chunk_size
+        end = start + expected_chunk_size(session, index) - 1
+        if ranges and ranges[-1][1] + 1 == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+def missing_chunks(session):
+    """Índices de las partes que faltan por subir"""
+    received = set(received_chunks(session))
+    return [index for index in range(total_chunks(session)) if index not in received]
+
+
+def _set_status(session_id, status, current):
+    """Cambia el estado de la subida solo si sigue en `current`. Devuelve True si lo consigue"""
+    table = UploadSession.__table__
+    with db.engine.begin() as connection:
+        result = connection.execute(
+            update(table)
+            .where(table.c.id == session_id, table.c.status == current)
+            .values(status=status))
+    return result.rowcount == 1
+
+
+def complete_session(session):
+    """
+    Une las partes en un solo archivo y crea el trabajo de importación
+
+    La subida se reclama con un UPDATE condicional (como claim_job): si dos
+    peticiones la completan a la vez, solo una crea el trabajo.
+
+    Returns:
+        El InventoryJob creado (pendiente, ver submit_job), o None si otra
+        petición ya había completado la subida
+
+    Raises:
+        ChunkError: Si faltan partes
+    """
+    missing = missing_chunks(session)
+    if missing:
+        raise ChunkError(f"Faltan {len(missing)} partes por subir")
+
+    if not _set_status(session.id, "completed", "open"):
+        db.session.refresh(session)
+        return None
+
+    try:
+        file_path = job_file_path(session.filename)
+        with open(file_path, "wb") as target:
+            for index in range(total_chunks(session)):
+                with open(_chunk_path(session, index), "rb") as chunk:
+                    shutil.copyfileobj(chunk, target, 1024 * 1024)
+
+        job = create_job_for_path(session.user_id, session.kind, session.filename, file_path)
+    except Exception:
+        # Se puede volver a intentar: la subida vuelve a quedar abierta
+        db.session.rollback()
+        _set_status(session.id, "open", "completed")
+        raise
+
+    session.status = "completed"
+    session.job_id = job.id
+    db.session.commit()
+
+    remove_session_files(session)
+    return job
+
+
+def expire_sessions():
+    """
+    Borra las subidas abiertas desde hace más de UPLOAD_SESSION_TTL_SECONDS
+    (abandonadas por el cliente) y sus partes
+
+    Cada subida se borra con un DELETE condicional sobre su estado, así una
+    subida que se está completando en ese momento no se toca.
+
+    Returns:
+        Número de subidas borradas
+    """
+    table = UploadSession.__table__
+    created_before = datetime.datetime.utcnow() - datetime.timedelta(seconds=UPLOAD_SESSION_TTL_SECONDS)
+    sessions = db.session.execute(
+        db.select(UploadSession)
+        .where(UploadSession.status == "open", UploadSession.created_at < created_before)
+    ).scalars().all()
+
+    expired = 0
+    for session in sessions:
+        with db.engine.begin() as connection:
+            result = connection.execute(
+                delete(table).where(table.c.id == session.id, table.c.status == "open"))
+        if result.rowcount == 1:
+            remove_session_files(session)
+            expired += 1
+    db.session.rollback()
+
+    if expired:
+        print(f"{expired} subidas por partes abandonadas eliminadas")
+    return expired
+
+
+def remove_session_files(session):
+    """Borra las partes de la subida"""
+    shutil.rmtree(_session_folder(session), ignore_errors=True)
@@ -0,0 +1,29 @@
+# En api/service/executors.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Pools de hilos de los servicios en segundo plano, por nombre
+_executors = {}
+_lock = threading.Lock()
+
+
+def get_executor(name, max_workers):
+    """
+    Pool de hilos compartido por nombre
+
+    Se crea la primera vez que se usa y no al importar el módulo, así cada
+    proceso de gunicorn tiene sus propios hilos (los hilos no sobreviven al fork).
+
+    Args:
+        name: Nombre del pool (también es el prefijo de los hilos)
+        max_workers: Número de hilos (solo se usa al crear el pool)
+
+    Returns:
+        El ThreadPoolExecutor del pool
+    """
+    with _lock:
+        executor = _executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+            _executors[name] = executor
+        return executor
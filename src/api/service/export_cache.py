@@ -0,0 +1,92 @@
+# En api/service/export_cache.py
+import os
+import threading
+from collections import OrderedDict
+from sqlalchemy import select, update
+from api.models import db, User
+
+# Memoria máxima (por proceso) para exportaciones ya generadas
+EXPORT_CACHE_MAX_BYTES = int(os.getenv("EXPORT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Las exportaciones más grandes que esto no se guardan (solo se envían)
+EXPORT_CACHE_ENTRY_MAX_BYTES = int(os.getenv("EXPORT_CACHE_ENTRY_MAX_BYTES", 8 * 1024 * 1024))
+
+
+class ExportCache:
+    """
+    Caché LRU de exportaciones, con límite por tamaño total en bytes
+
+    Las claves incluyen la versión del inventario, así que nunca hace falta
+    invalidar: las entradas antiguas dejan de pedirse y acaban expulsadas.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+export_cache = ExportCache(EXPORT_CACHE_MAX_BYTES)
+
+
+def bump_inventory_version(user_id):
+    """
+    Incrementa la versión del inventario del usuario. Se llama en la misma
+    transacción que la escritura de Productos (antes del commit).
+    """
+    table = User.__table__
+    db.session.execute(
+        update(table)
+        .where(table.c.id == user_id)
+        .values(inventory_version=table.c.inventory_version + 1))
+
+
+def current_inventory_version(user_id):
+    """Versión actual del inventario del usuario (dentro de la transacción en curso)"""
+    table = User.__table__
+    return db.session.execute(
+        select(table.c.inventory_version).where(table.c.id == user_id)).scalar()
+
+
+def export_key(user, export_format, compress=False):
+    """Clave de caché y ETag de una exportación: (usuario, versión, formato)"""
+    suffix = ".gz" if compress else ""
+    return f"{user.id}-{user.inventory_version}-{export_format}{suffix}"
+
+
+def iter_and_cache(key, chunks):
+    """
+    Envía los trozos según se generan y, si la exportación completa cabe en
+    EXPORT_CACHE_ENTRY_MAX_BYTES, la guarda en la caché al terminar
+    """
+    parts = []
+    size = 0
+    for chunk in chunks:
+        if parts is not None:
+            size += len(chunk)
+            if size <= EXPORT_CACHE_ENTRY_MAX_BYTES:
+                parts.append(chunk)
+            else:
+                parts = None
+        yield chunk
+
+    if parts is not None:
+        export_cache.put(key, b"".join(parts))
@@ -0,0 +1,127 @@
+# En api/service/image_variants.py
+"""
+Variantes de las imágenes de producto (miniaturas WebP/AVIF)
+
+Después de subir la imagen original, un pool de hilos la decodifica una sola
+vez y genera una miniatura por cada ancho y formato, que se guardan en el
+mismo bucket junto al original. Las tarjetas de producto usan las variantes
+en lugar de la foto a resolución completa.
+"""
+import os
+import io
+import traceback
+from sqlalchemy import update
+from api.models import db, ProductImage
+from api.service.storage import upload_stream, INVENTORY_BUCKET
+from api.service.executors import get_executor
+
+# Anchos (en píxeles) de las miniaturas; nunca se amplía la imagen
+IMAGE_VARIANT_WIDTHS = tuple(
+    int(width) for width in os.getenv("IMAGE_VARIANT_WIDTHS", "320,640").split(","))
+
+# Hilos que generan variantes (Pillow libera el GIL al escalar y codificar)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+
+# Formato: (tipo de contenido, opciones de Pillow)
+VARIANT_FORMATS = {
+    "webp": ("image/webp", {"quality": 80, "method": 4}),
+    "avif": ("image/avif", {"quality": 60, "speed": 8}),
+}
+
+
+def available_formats():
+    """Formatos de VARIANT_FORMATS que sabe escribir el Pillow instalado"""
+    from PIL import features
+    return [name for name in VARIANT_FORMATS if features.check(name)]
+
+
+def variant_key(object_key, width, image_format):
+    """Clave de una variante, junto al original: <clave sin extensión>_w<ancho>.<formato>"""
+    stem = os.path.splitext(object_key)[0]
+    return f"{stem}_w{width}.{image_format}"
+
+
+def generate_variants(data, object_key):
+    """
+    Decodifica la imagen una vez y sube sus variantes
+
+    Args:
+        data: Objeto archivo con la imagen original
+        object_key: Clave del original en el bucket
+
+    Returns:
+        Diccionario {formato: {ancho: clave}} con las variantes subidas
+    """
+    from PIL import Image, ImageOps
+
+    formats = available_formats()
+    if not formats:
+        return {}
+    widths = sorted(IMAGE_VARIANT_WIDTHS, reverse=True)
+
+    with Image.open(data) as original:
+        # JPEG: decodifica directamente a escala reducida si sobra resolución
+        original.draft("RGB", (widths[0], widths[0]))
+        image = ImageOps.exif_transpose(original)
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    variants = {image_format: {} for image_format in formats}
+    for width in widths:
+        # Cada ancho sale del anterior (más grande), no del original
+        if width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+        elif variants[formats[0]]:
+            # Más pequeña que este ancho: ya está cubierta por el anterior
+            continue
+
+        for image_format in formats:
+            content_type, options = VARIANT_FORMATS[image_format]
+            output = io.BytesIO()
+            image.save(output, image_format.upper(), **options)
+            output.seek(0)
+
+            key = variant_key(object_key, width, image_format)
+            upload_stream(output, INVENTORY_BUCKET, key, content_type)
+            variants[image_format][str(width)] = key
+
+    return variants
+
+
+def _process_image(app, data, object_key, image_id):
+    """Genera las variantes y deja el registro en "done" (con sus claves) o "failed" """
+    try:
+        variants = generate_variants(data, object_key)
+        values = {"status": "done", "variants": variants}
+        print(f"Variantes generadas para {object_key}")
+    except Exception as e:
+        print(f"No se pudieron generar las variantes de {object_key}: {str(e)}")
+        print(traceback.format_exc())
+        values = {"status": "failed"}
+    finally:
+        data.close()
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(
+                update(ProductImage.__table__)
+                .where(ProductImage.__table__.c.id == image_id)
+                .values(**values))
+
+
+def start_variants(app, data, object_key, image_id):
+    """
+    Encola la generación de variantes de una imagen ya subida
+
+    Args:
+        app: Aplicación Flask (el hilo abre su propio contexto)
+        data: Copia privada de la imagen (ver spool_copy); se cierra al terminar
+        object_key: Clave del original en el bucket
+        image_id: Registro de ProductImage que se actualiza al terminar
+
+    Returns:
+        Future de la tarea
+    """
+    return get_executor("image", IMAGE_WORKERS).submit(
+        _process_image, app, data, object_key, image_id)
@@ -0,0 +1,283 @@
+# En api/service/import_jobs.py
+import os
+import time
+import uuid
+import datetime
+import threading
+import traceback
+from sqlalchemy import update
+from werkzeug.utils import secure_filename
+from api.models import db, InventoryJob
+from api.service.inventory_validation import InventoryValidationError
+from api.service.executors import get_executor
+
+# Carpeta donde se guardan los archivos hasta que el trabajo termina
+IMPORT_JOBS_FOLDER = os.getenv("IMPORT_JOBS_FOLDER", os.path.join("upload", "jobs"))
+
+# "thread": los trabajos se ejecutan en un pool dentro del proceso web
+# "cli": se quedan pendientes hasta que los recoge `flask import-worker`
+IMPORT_JOBS_MODE = os.getenv("IMPORT_JOBS_MODE", "thread")
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", 2))
+
+# Un trabajo que lleva más de esto "running" se da por interrumpido (reinicio
+# del proceso); y un archivo de IMPORT_JOBS_FOLDER más antiguo que esto sin
+# trabajo pendiente o en curso se da por huérfano
+IMPORT_JOB_STALE_SECONDS = int(os.getenv("IMPORT_JOB_STALE_SECONDS", 3600))
+
+# Cada cuánto se buscan trabajos interrumpidos o pendientes (modo "thread")
+IMPORT_JOB_RECOVERY_INTERVAL = int(os.getenv("IMPORT_JOB_RECOVERY_INTERVAL", 300))
+
+_last_recovery = None
+_recovery_lock = threading.Lock()
+
+
+def create_job(user_id, kind, file):
+    """
+    Guarda el archivo subido y registra un trabajo pendiente
+
+    Args:
+        user_id: Usuario que sube el inventario
+        kind: "upload" o "update"
+        file: FileStorage de la petición
+
+    Returns:
+        El InventoryJob creado (ya guardado en la base de datos)
+    """
+    file_path = job_file_path(file.filename)
+    file.save(file_path)
+    return create_job_for_path(user_id, kind, file.filename, file_path)
+
+
+def job_file_path(filename):
+    """Ruta única en IMPORT_JOBS_FOLDER para el archivo de un trabajo"""
+    os.makedirs(IMPORT_JOBS_FOLDER, exist_ok=True)
+    return os.path.join(
+        IMPORT_JOBS_FOLDER, f"{uuid.uuid4().hex}_{secure_filename(filename)}")
+
+
+def create_job_for_path(user_id, kind, filename, file_path):
+    """
+    Registra un trabajo pendiente para un archivo que ya está en disco
+    (ver job_file_path). El archivo se borra cuando termina el trabajo.
+    """
+    job = InventoryJob(
+        kind=kind,
+        status="pending",
+        filename=filename,
+        file_path=file_path,
+        user_id=user_id
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def submit_job(app, job_id):
+    """Envía el trabajo al pool del proceso (si no se usa el worker de la CLI)"""
+    if IMPORT_JOBS_MODE != "thread":
+        return
+    get_executor("inventory-job", IMPORT_WORKERS).submit(_run_in_app_context, app, job_id)
+
+
+def _run_in_app_context(app, job_id):
+    with app.app_context():
+        run_job(job_id)
+
+
+def _update_job(job_id, **values):
+    """
+    Actualiza el trabajo en una transacción propia, para no hacer commit
+    de la importación que está en curso en db.session
+    """
+    with db.engine.begin() as connection:
+        connection.execute(
+            update(InventoryJob.__table__)
+            .where(InventoryJob.__table__.c.id == job_id)
+            .values(**values))
+
+
+def claim_job(job_id):
+    """Marca el trabajo como en curso si sigue pendiente. Devuelve True si lo consigue"""
+    table = InventoryJob.__table__
+    with db.engine.begin() as connection:
+        result = connection.execute(
+            update(table)
+            .where(table.c.id == job_id, table.c.status == "pending")
+            .values(status="running", started_at=datetime.datetime.utcnow()))
+    return result.rowcount == 1
+
+
+def run_job(job_id):
+    """
+    Ejecuta un trabajo de importación pendiente y guarda el resultado
+
+    Los trabajos "export" generan la exportación del inventario en Tigris.
+    Devuelve True si el trabajo se ha procesado (bien o con error) y False
+    si otro worker ya lo había reclamado.
+    """
+    # Importación diferida: las rutas importan este módulo
+    from api.Routes.upload_routes import process_inventory_file, export_inventory_file
+
+    if not claim_job(job_id):
+        return False
+
+    job = db.session.get(InventoryJob, job_id)
+    user_id, kind, file_path, filename = job.user_id, job.kind, job.file_path, job.filename
+    db.session.expunge(job)
+
+    def on_progress(rows_processed):
+        # En SQLite la importación tiene bloqueada la base de datos hasta el commit
+        if db.engine.dialect.name != "sqlite":
+            _update_job(job_id, rows_processed=rows_processed)
+
+    try:
+        if kind == "export":
+            # Exportación: el archivo se genera directamente en el bucket
+            result = export_inventory_file(user_id, filename)
+            _update_job(
+                job_id,
+                status="done",
+                rows_processed=result['rows'],
+                result=result,
+                finished_at=datetime.datetime.utcnow()
+            )
+            return True
+
+        tigris_file, stats = process_inventory_file(
+            user_id, file_path, filename, kind, on_progress=on_progress)
+
+        _update_job(
+            job_id,
+            status="done",
+            rows_processed=stats['added'] + stats['updated'] + stats['unchanged'],
+            rows_per_sec=stats['rows_per_sec'],
+            result={**stats, "file_id": tigris_file.id},
+            finished_at=datetime.datetime.utcnow()
+        )
+    except InventoryValidationError as e:
+        db.session.rollback()
+        _update_job(
+            job_id,
+            status="failed",
+            error=str(e),
+            result=e.report,
+            finished_at=datetime.datetime.utcnow()
+        )
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error en el trabajo de importación {job_id}: {str(e)}")
+        print(traceback.format_exc())
+        _update_job(
+            job_id,
+            status="failed",
+            error=str(e)[:1000],
+            finished_at=datetime.datetime.utcnow()
+        )
+    finally:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+
+    return True
+
+
+def next_pending_job_id():
+    """Devuelve el id del trabajo pendiente más antiguo (o None)"""
+    return db.session.execute(
+        db.select(InventoryJob.id)
+        .where(InventoryJob.status == "pending")
+        .order_by(InventoryJob.id)
+        .limit(1)
+    ).scalar()
+
+
+def reap_jobs():
+    """
+    Limpia lo que dejan los procesos que se reinician a mitad de un trabajo
+
+    Los trabajos "running" desde hace más de IMPORT_JOB_STALE_SECONDS pasan a
+    "failed" (pueden haber escrito parte de la importación, así que no se
+    repiten solos) y se borran los archivos huérfanos de IMPORT_JOBS_FOLDER.
+
+    Returns:
+        Número de trabajos marcados como fallidos
+    """
+    table = InventoryJob.__table__
+    now = datetime.datetime.utcnow()
+    stale_before = now - datetime.timedelta(seconds=IMPORT_JOB_STALE_SECONDS)
+    with db.engine.begin() as connection:
+        result = connection.execute(
+            update(table)
+            .where(table.c.status == "running", table.c.started_at < stale_before)
+            .values(status="failed", error="Trabajo interrumpido (reinicio del servidor)",
+                    finished_at=now))
+        active_paths = {
+            os.path.abspath(path) for (path,) in connection.execute(
+                db.select(table.c.file_path)
+                .where(table.c.status.in_(("pending", "running")),
+                       table.c.file_path.isnot(None)))
+        }
+
+    if os.path.isdir(IMPORT_JOBS_FOLDER):
+        cutoff = time.time() - IMPORT_JOB_STALE_SECONDS
+        for name in os.listdir(IMPORT_JOBS_FOLDER):
+            path = os.path.abspath(os.path.join(IMPORT_JOBS_FOLDER, name))
+            # Los recientes pueden ser de un trabajo que aún no se ha registrado
+            try:
+                if path not in active_paths and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    print(f"Archivo de trabajo huérfano eliminado: {name}")
+            except OSError:
+                pass
+
+    if result.rowcount:
+        print(f"{result.rowcount} trabajos interrumpidos marcados como fallidos")
+    return result.rowcount
+
+
+def pending_job_ids():
+    """Ids de los trabajos pendientes, del más antiguo al más reciente"""
+    return db.session.execute(
+        db.select(InventoryJob.id)
+        .where(InventoryJob.status == "pending")
+        .order_by(InventoryJob.id)
+    ).scalars().all()
+
+
+def _recover_in_app_context(app):
+    # Importación diferida: chunked_upload importa este módulo
+    from api.service.chunked_upload import expire_sessions
+
+    with app.app_context():
+        try:
+            reap_jobs()
+            expire_sessions()
+            job_ids = pending_job_ids()
+            db.session.rollback()
+            for job_id in job_ids:
+                # claim_job evita que se ejecute dos veces si otro proceso también lo envía
+                submit_job(app, job_id)
+        except Exception as e:
+            print(f"Error al recuperar los trabajos de importación: {str(e)}")
+            print(traceback.format_exc())
+
+
+def setup_job_recovery(app):
+    """
+    En modo "thread" nadie más recoge los trabajos pendientes de un proceso que
+    se reinició: cada proceso los busca (y limpia los interrumpidos y las
+    subidas por partes abandonadas) en su
+    primera petición y después cada IMPORT_JOB_RECOVERY_INTERVAL segundos,
+    en segundo plano
+    """
+    if IMPORT_JOBS_MODE != "thread":
+        return
+
+    @app.before_request
+    def recover_jobs():
+        global _last_recovery
+        now = time.monotonic()
+        with _recovery_lock:
+            if _last_recovery is not None and now - _last_recovery < IMPORT_JOB_RECOVERY_INTERVAL:
+                return
+            _last_recovery = now
+        get_executor("inventory-job", IMPORT_WORKERS).submit(_recover_in_app_context, app)
@@ -0,0 +1,232 @@
+# En api/service/inventory_export.py
+import os
+import io
+import csv
+import json
+import zlib
+from functools import lru_cache
+from openpyxl import Workbook
+from openpyxl.styles import Font
+from openpyxl.worksheet.datavalidation import DataValidation
+from sqlalchemy import select, func
+from api.models import db, Productos
+from api.service.inventory_import import EXPECTED_COLUMNS
+from api.service.xlsx_stream import iter_xlsx
+
+# Filas que se leen de la base de datos en cada lote del cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 2000))
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Filas de la plantilla a las que se aplican los formatos y validaciones
+TEMPLATE_ROWS = int(os.getenv("TEMPLATE_ROWS", 10000))
+
+# Subir al cambiar la plantilla: forma parte del ETag (el archivo generado
+# lleva fechas y no es idéntico byte a byte entre procesos)
+TEMPLATE_VERSION = 1
+
+# Formatos de exportación: tipo de contenido y extensión del archivo
+EXPORT_FORMATS = {
+    "xlsx": (XLSX_MIMETYPE, "xlsx"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson")
+}
+
+
+def inventory_select(user_id):
+    """Consulta (core, sin objetos ORM) de las columnas exportadas del inventario"""
+    table = Productos.__table__
+    return (
+        select(table.c.product_name, table.c.price_per_unit,
+               table.c.description, table.c.quantity)
+        .where(table.c.user_id == user_id)
+        .order_by(table.c.id)
+    )
+
+
+def has_products(user_id):
+    """Indica si el usuario tiene algún producto (consulta barata con LIMIT 1)"""
+    table = Productos.__table__
+    return db.session.execute(
+        select(table.c.id).where(table.c.user_id == user_id).limit(1)
+    ).first() is not None
+
+
+def count_products(user_id):
+    """Número de productos del usuario"""
+    table = Productos.__table__
+    return db.session.execute(
+        select(func.count()).select_from(table).where(table.c.user_id == user_id)
+    ).scalar()
+
+
+def iter_inventory_batches(user_id, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Lee el inventario por lotes con un cursor de servidor
+
+    Usa una conexión propia que se cierra al terminar, así se puede consumir
+    mientras se envía la respuesta.
+
+    Returns:
+        Generador de listas de tuplas (nombre, precio, descripción, unidades)
+    """
+    with db.engine.connect() as connection:
+        result = connection.execution_options(
+            stream_results=True, yield_per=batch_size
+        ).execute(inventory_select(user_id))
+        for partition in result.partitions():
+            yield [tuple(row) for row in partition]
+
+
+def iter_inventory_xlsx(user_id):
+    """Genera el .xlsx del inventario en trozos de bytes (memoria constante)"""
+    return iter_xlsx(EXPECTED_COLUMNS, iter_inventory_batches(user_id), sheet_name="Inventario")
+
+
+def iter_inventory_csv(user_id):
+    """Genera el CSV del inventario (con cabecera), un trozo por lote"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPECTED_COLUMNS)
+    for batch in iter_inventory_batches(user_id):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def iter_inventory_ndjson(user_id):
+    """Genera el inventario en NDJSON (un objeto JSON por línea), un trozo por lote"""
+    for batch in iter_inventory_batches(user_id):
+        yield "".join(
+            json.dumps(dict(zip(EXPECTED_COLUMNS, row)), ensure_ascii=False) + "\n"
+            for row in batch
+        ).encode()
+
+
+def export_filename(user_id, export_format, compress=False):
+    """Nombre del archivo de exportación (inventario_usuario_<id>.<ext>[.gz])"""
+    extension = EXPORT_FORMATS[export_format][1]
+    return f"inventario_usuario_{user_id}.{extension}{'.gz' if compress else ''}"
+
+
+def parse_export_filename(filename):
+    """Formato y compresión a partir del nombre (ver export_filename)"""
+    compress = filename.endswith(".gz")
+    extension = filename[:-3] if compress else filename
+    return extension.rsplit(".", 1)[1], compress
+
+
+class ChunkReader(io.RawIOBase):
+    """Objeto archivo de solo lectura sobre un generador de bytes (para upload_fileobj)"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = b""
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            try:
+                self._pending = next(self._chunks)
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        self.bytes_read += size
+        return size
+
+
+def gzip_chunks(chunks):
+    """Comprime en gzip un generador de bytes sin juntarlo en memoria"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_inventory_export(user_id, export_format, compress=False):
+    """
+    Genera la exportación del inventario en el formato pedido
+
+    Args:
+        user_id: Usuario propietario del inventario
+        export_format: "xlsx", "csv" o "ndjson" (ver EXPORT_FORMATS)
+        compress: Comprimir en gzip (solo formatos de texto; xlsx ya es un zip)
+
+    Returns:
+        Generador de bytes listos para enviar
+    """
+    if export_format == "csv":
+        chunks = iter_inventory_csv(user_id)
+    elif export_format == "ndjson":
+        chunks = iter_inventory_ndjson(user_id)
+    else:
+        return iter_inventory_xlsx(user_id)
+
+    return gzip_chunks(chunks) if compress else chunks
+
+
+@lru_cache(maxsize=1)
+def inventory_template():
+    """
+    Plantilla .xlsx vacía para cargar el inventario. Se genera una sola vez
+    por proceso (la primera vez que se pide) y se sirve desde memoria.
+
+    Las columnas llevan formato (texto, precio con dos decimales, unidades
+    enteras) y validación de datos con mensajes de ayuda en Excel.
+
+    Returns:
+        Tupla (bytes del archivo, ETag)
+    """
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Inventario"
+    sheet.append(EXPECTED_COLUMNS)
+    sheet.freeze_panes = "A2"
+
+    last_row = TEMPLATE_ROWS + 1
+    columns = {
+        # columna: (formato, ancho, validación)
+        "A": ("@", 35, DataValidation(
+            type="textLength", operator="between", formula1="1", formula2="120",
+            promptTitle="Nombre del producto", prompt="Obligatorio, máximo 120 caracteres",
+            errorTitle="Nombre no válido", error="El nombre es obligatorio (máximo 120 caracteres)")),
+        "B": ("0.00", 18, DataValidation(
+            type="decimal", operator="greaterThanOrEqual", formula1="0",
+            promptTitle="Precio por unidad", prompt="Número mayor o igual que 0",
+            errorTitle="Precio no válido", error="El precio debe ser un número mayor o igual que 0")),
+        "C": ("@", 50, DataValidation(
+            type="textLength", operator="lessThanOrEqual", formula1="500", allow_blank=True,
+            promptTitle="Descripción", prompt="Opcional, máximo 500 caracteres",
+            errorTitle="Descripción no válida", error="La descripción no puede superar 500 caracteres")),
+        "D": ("0", 12, DataValidation(
+            type="whole", operator="greaterThanOrEqual", formula1="0",
+            promptTitle="Unidades", prompt="Número entero mayor o igual que 0",
+            errorTitle="Unidades no válidas", error="Las unidades deben ser un número entero mayor o igual que 0")),
+    }
+
+    for letter, (number_format, width, validation) in columns.items():
+        sheet[f"{letter}1"].font = Font(bold=True)
+        sheet.column_dimensions[letter].width = width
+        sheet.column_dimensions[letter].number_format = number_format
+        for (cell,) in sheet.iter_rows(min_row=2, max_row=last_row,
+                                       min_col=ord(letter) - 64, max_col=ord(letter) - 64):
+            cell.number_format = number_format
+
+        validation.showInputMessage = True
+        validation.showErrorMessage = True
+        validation.add(f"{letter}2:{letter}{last_row}")
+        sheet.add_data_validation(validation)
+
+    output = io.BytesIO()
+    workbook.save(output)
+    data = output.getvalue()
+    return data, f"plantilla-v{TEMPLATE_VERSION}-{TEMPLATE_ROWS}"
@@ -0,0 +1,359 @@
+# En api/service/inventory_import.py
+import os
+import io
+import csv
+import gzip
+import zlib
+import shutil
+import zipfile
+import tempfile
+from contextlib import contextmanager
+from itertools import islice
+import xml.etree.ElementTree as ET
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+import pandas as pd
+from api.service.parallel_parse import (
+    should_parse_in_parallel, iter_xlsx_rows_parallel,
+    should_parse_csv_in_parallel, iter_csv_frames_parallel)
+
+# Columnas obligatorias del archivo de inventario
+EXPECTED_COLUMNS = ['nombre_del_producto',
+                    'precio_por_unidad', 'descripción', 'unidades']
+
+# Número de filas que se validan y guardan de una vez
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 2000))
+
+# Extensiones aceptadas en los endpoints de inventario
+INVENTORY_EXTENSIONS = (".xlsx", ".xls", ".csv", ".csv.gz",
+                        ".parquet", ".arrow", ".feather")
+
+# Los archivos gzip empiezan siempre por estos dos bytes
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Productos con estas unidades o menos se consideran con stock bajo
+LOW_STOCK_THRESHOLD = 5
+
+
+class InventoryFormatError(ValueError):
+    """El archivo de inventario no tiene el formato esperado"""
+
+
+def _parser_errors():
+    """
+    Excepciones de los lectores que indican un archivo dañado o que no es
+    del formato de su extensión (zip o XML roto, gzip truncado, codificación
+    incorrecta, Parquet/Arrow inválido...)
+    """
+    errors = [zipfile.BadZipFile, InvalidFileException, ET.ParseError,
+              gzip.BadGzipFile, zlib.error, EOFError, UnicodeDecodeError, ValueError]
+    try:
+        import pyarrow
+        errors.append(pyarrow.ArrowException)
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+PARSER_ERRORS = _parser_errors()
+
+
+def normalize_column(name):
+    """Normaliza el nombre de una columna (minúsculas y guiones bajos)"""
+    return str(name).strip().lower().replace(' ', '_')
+
+
+def _rows_from_header(rows):
+    """
+    Valida la cabecera y convierte cada fila (tupla) en un diccionario
+    con las columnas esperadas
+
+    Args:
+        rows: Iterador de pares (número de fila en la hoja, tupla de valores);
+            si el número es None se toma el siguiente al de la fila anterior
+
+    Returns:
+        Generador de pares (número de fila, diccionario)
+    """
+    first = next(rows, None)
+    if first is None:
+        raise InventoryFormatError("El archivo está vacío")
+    row_number, header = first
+
+    columns = [normalize_column(col) if col is not None else '' for col in header]
+    if not all(col in columns for col in EXPECTED_COLUMNS):
+        raise InventoryFormatError(
+            "El archivo no contiene las columnas esperadas")
+
+    positions = {col: columns.index(col) for col in EXPECTED_COLUMNS}
+
+    for number, row in rows:
+        row_number = number or row_number + 1
+        # Las hojas en modo lectura pueden traer filas vacías al final
+        if row is None or all(value is None for value in row):
+            continue
+        yield row_number, {col: (row[pos] if pos < len(row) else None)
+                           for col, pos in positions.items()}
+
+
+def allowed_inventory_file(filename):
+    """Verifica si el archivo de inventario tiene una extensión soportada"""
+    return filename.lower().endswith(INVENTORY_EXTENSIONS)
+
+
+def inventory_format(file_path):
+    """Formato del archivo según su extensión: xlsx, xls, csv, parquet o arrow"""
+    name = file_path.lower()
+    if name.endswith((".csv", ".csv.gz")):
+        return "csv"
+    if name.endswith(".parquet"):
+        return "parquet"
+    if name.endswith((".arrow", ".feather")):
+        return "arrow"
+    if name.endswith(".xls"):
+        return "xls"
+    return "xlsx"
+
+
+@contextmanager
+def open_source(source):
+    """
+    Abre el origen en binario y desde el principio. Acepta una ruta o un
+    objeto archivo (el stream de la subida); este último no se cierra.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            yield f
+    else:
+        source.seek(0)
+        try:
+            yield source
+        finally:
+            source.seek(0)
+
+
+def _is_gzip(source):
+    """Detecta gzip por los bytes iniciales (.csv.gz o subidas con Content-Encoding: gzip)"""
+    with open_source(source) as f:
+        return f.read(2) == GZIP_MAGIC
+
+
+@contextmanager
+def _as_path(source, suffix):
+    """
+    Devuelve una ruta para el origen. Si es un stream en memoria se vuelca a
+    un archivo temporal privado que se borra al terminar.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        yield source
+        return
+
+    spill = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+    try:
+        with spill, open_source(source) as f:
+            shutil.copyfileobj(f, spill)
+        yield spill.name
+    finally:
+        os.remove(spill.name)
+
+
+def _check_frames(frames):
+    """
+    Valida las columnas del primer bloque y deja en cada bloque (DataFrame)
+    solo las columnas esperadas, sin las filas vacías
+    """
+    checked = False
+    for df in frames:
+        df.columns = [normalize_column(col) for col in df.columns]
+        if not checked:
+            if not all(col in df.columns for col in EXPECTED_COLUMNS):
+                raise InventoryFormatError(
+                    "El archivo no contiene las columnas esperadas")
+            checked = True
+
+        yield df[EXPECTED_COLUMNS].dropna(how="all")
+
+    if not checked:
+        raise InventoryFormatError("El archivo está vacío")
+
+
+def _frames_from_rows(rows, size=IMPORT_CHUNK_SIZE):
+    """
+    Agrupa las filas de una hoja (pares (número, tupla), con cabecera) en
+    bloques DataFrame cuyo índice es el número de fila
+    """
+    for chunk in iter_chunks(_rows_from_header(rows), size):
+        numbers, records = zip(*chunk)
+        yield pd.DataFrame(list(records), columns=EXPECTED_COLUMNS, index=list(numbers))
+
+
+def records_from_frames(frames):
+    """Convierte cada bloque (DataFrame) en diccionarios con las columnas esperadas"""
+    for df in frames:
+        # Las unidades llegan como float si el bloque tiene huecos
+        units = pd.to_numeric(df['unidades'], errors='coerce')
+        if units.notna().sum() == df['unidades'].notna().sum() and (units.dropna() % 1 == 0).all():
+            df = df.assign(unidades=units.astype('Int64'))
+
+        df = df.astype(object).where(pd.notna(df), None)
+        yield from df.to_dict(orient="records")
+
+
+def _iter_csv_frames(source, max_rows=None):
+    """Lee un CSV (opcionalmente gzip) por bloques con el parser en C de pandas"""
+    compression = "gzip" if _is_gzip(source) else None
+
+    # Los ERP en español suelen exportar con ";" y coma decimal
+    with open_source(source) as f:
+        raw = gzip.GzipFile(fileobj=f) if compression else f
+        text = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline="")
+        sample = text.read(64 * 1024)
+        # Soltar el envoltorio sin cerrar el stream de la subida
+        text.detach()
+    try:
+        delimiter = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimiter = ","
+    decimal = "," if delimiter == ";" else "."
+
+    # CSV grandes: los segmentos se reparten entre varios procesos (IMPORT_PARSE_WORKERS)
+    if max_rows is None and should_parse_csv_in_parallel(source, compression is not None):
+        yield from iter_csv_frames_parallel(source, delimiter, decimal)
+        return
+
+    with open_source(source) as f:
+        try:
+            # Las líneas en blanco se leen (y se descartan después) para que
+            # el índice siga siendo el número de línea
+            for df in pd.read_csv(
+                f,
+                sep=delimiter,
+                decimal=decimal,
+                compression=compression,
+                encoding="utf-8-sig",
+                chunksize=IMPORT_CHUNK_SIZE,
+                nrows=max_rows,
+                skip_blank_lines=False
+            ):
+                # La cabecera es la línea 1
+                df.index += 2
+                yield df
+        except pd.errors.EmptyDataError:
+            return
+
+
+def _iter_arrow_frames(source, kind):
+    """Lee un archivo Parquet o Arrow IPC por lotes de registros"""
+    try:
+        import pyarrow.parquet as pq
+        import pyarrow.ipc as ipc
+    except ImportError:
+        raise InventoryFormatError(
+            "El servidor no tiene soporte para Parquet/Arrow (falta pyarrow)")
+
+    with open_source(source) as f:
+        if kind == "parquet":
+            parquet_file = pq.ParquetFile(f)
+            yield from _numbered_frames(parquet_file.iter_batches(batch_size=IMPORT_CHUNK_SIZE))
+        else:
+            with ipc.open_file(f) as reader:
+                yield from _numbered_frames(
+                    reader.get_batch(i) for i in range(reader.num_record_batches))
+
+
+def _numbered_frames(batches):
+    """Convierte los lotes en DataFrames numerados como una hoja con cabecera (desde la fila 2)"""
+    first_row = 2
+    for batch in batches:
+        df = batch.to_pandas()
+        df.index = pd.RangeIndex(first_row, first_row + len(df))
+        first_row += len(df)
+        yield df
+
+
+def _limit_frames(frames, max_rows):
+    """Corta los bloques al llegar a `max_rows` filas y deja de leer"""
+    remaining = max_rows
+    for df in frames:
+        if remaining <= 0:
+            return
+        yield df.iloc[:remaining]
+        remaining -= len(df)
+
+
+def iter_inventory_frames(source, filename=None, max_rows=None):
+    """
+    Lee el archivo de inventario por bloques (DataFrame) sin cargarlo entero
+    en memoria
+
+    CSV, CSV gzip, Parquet y Arrow van por la vía rápida (lectura por bloques
+    en columnas); los libros Excel se leen en streaming con openpyxl.
+
+    Args:
+        source: Ruta del archivo o stream de la subida (se lee desde el principio)
+        filename: Nombre original, para saber el formato (por defecto la ruta)
+        max_rows: Si se indica, solo se leen la cabecera y las primeras filas
+
+    Returns:
+        Generador de DataFrames con las columnas de EXPECTED_COLUMNS; el
+        índice es el número de fila en el archivo (la cabecera es la fila 1),
+        que se mantiene aunque se descarten las filas vacías
+
+    Raises:
+        InventoryFormatError: Si faltan columnas o el archivo no se puede leer
+    """
+    filename = filename or str(source)
+    kind = inventory_format(filename)
+    frames = _iter_frames(source, kind, max_rows)
+    if max_rows is not None:
+        frames = _limit_frames(frames, max_rows)
+
+    # Los errores de los lectores se devuelven al cliente como un 400
+    try:
+        yield from frames
+    except InventoryFormatError:
+        raise
+    except PARSER_ERRORS as e:
+        raise InventoryFormatError(
+            f"No se pudo leer el archivo: está dañado o no es un archivo {kind} válido ({e})") from e
+
+
+def _iter_frames(source, kind, max_rows):
+    if kind == "csv":
+        yield from _check_frames(_iter_csv_frames(source, max_rows))
+    elif kind in ("parquet", "arrow"):
+        yield from _check_frames(_iter_arrow_frames(source, kind))
+    elif kind == "xlsx" and max_rows is None and should_parse_in_parallel(source):
+        # Hojas grandes: el XML se reparte entre varios procesos (IMPORT_PARSE_WORKERS),
+        # que necesitan abrir el libro por su ruta
+        with _as_path(source, ".xlsx") as file_path:
+            yield from _check_frames(_frames_from_rows(iter_xlsx_rows_parallel(file_path)))
+    elif kind == "xlsx":
+        # Modo solo lectura: openpyxl va leyendo el XML de la hoja bajo demanda
+        with open_source(source) as f:
+            workbook = load_workbook(f, read_only=True, data_only=True)
+            try:
+                sheet = workbook.active
+                # iter_rows empieza en la fila 1 y rellena los huecos
+                yield from _check_frames(_frames_from_rows(
+                    enumerate(sheet.iter_rows(values_only=True), start=1), min(max_rows or IMPORT_CHUNK_SIZE, IMPORT_CHUNK_SIZE)))
+            finally:
+                workbook.close()
+    else:
+        # El formato .xls antiguo no tiene lector en streaming (máx. 65536 filas)
+        with open_source(source) as f:
+            df = pd.read_excel(f, header=None, dtype=object,
+                               nrows=max_rows + 1 if max_rows is not None else None)
+        df = df.astype(object).where(pd.notna(df), None)
+        yield from _check_frames(_frames_from_rows(
+            enumerate(df.itertuples(index=False, name=None), start=1)))
+
+
+def iter_chunks(rows, size=IMPORT_CHUNK_SIZE):
+    """Agrupa un iterador de filas en listas de como máximo `size` elementos"""
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
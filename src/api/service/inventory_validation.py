@@ -0,0 +1,172 @@
+# En api/service/inventory_validation.py
+import os
+import time
+import numpy as np
+import pandas as pd
+from api.models import Productos
+from api.service.inventory_import import InventoryFormatError, LOW_STOCK_THRESHOLD
+
+# Máximo de errores (y de productos con stock bajo) que se devuelven en el informe
+INVENTORY_MAX_ERRORS = int(os.getenv("INVENTORY_MAX_ERRORS", 100))
+
+# Longitudes máximas de las columnas de la tabla productos
+NAME_MAX_LENGTH = Productos.__table__.c.product_name.type.length
+DESCRIPTION_MAX_LENGTH = Productos.__table__.c.description.type.length
+
+
+class InventoryValidationError(InventoryFormatError):
+    """Hay filas con errores; el informe va en `report`"""
+
+    def __init__(self, report):
+        super().__init__(
+            f"El archivo tiene {report['error_rows']} filas con errores")
+        self.report = report
+
+
+def validate_frame(df):
+    """
+    Valida un bloque con operaciones vectorizadas
+
+    Args:
+        df: DataFrame con las columnas de EXPECTED_COLUMNS
+
+    Returns:
+        Tupla (máscaras de error por (columna, mensaje), máscara de stock bajo,
+        bloque con los valores convertidos: nombres y descripciones como
+        texto, precios y unidades como números)
+    """
+    names = df['nombre_del_producto']
+    descriptions = df['descripción']
+    raw_prices = df['precio_por_unidad']
+    raw_units = df['unidades']
+    prices = pd.to_numeric(raw_prices, errors='coerce')
+    units = pd.to_numeric(raw_units, errors='coerce')
+    names = names.astype(object).where(names.isna(), names.astype(str))
+    descriptions = descriptions.astype(object).where(descriptions.isna(), descriptions.astype(str))
+
+    checks = {
+        ('nombre_del_producto', "Falta el nombre del producto"):
+            names.isna() | (names.str.strip() == ''),
+        ('nombre_del_producto', f"El nombre no puede tener más de {NAME_MAX_LENGTH} caracteres"):
+            names.str.len() > NAME_MAX_LENGTH,
+        ('descripción', f"La descripción no puede tener más de {DESCRIPTION_MAX_LENGTH} caracteres"):
+            descriptions.str.len() > DESCRIPTION_MAX_LENGTH,
+        ('precio_por_unidad', "Falta el precio"): raw_prices.isna(),
+        ('precio_por_unidad', "El precio no es un número"): raw_prices.notna() & prices.isna(),
+        ('precio_por_unidad', "El precio no puede ser negativo"): prices < 0,
+        ('unidades', "Faltan las unidades"): raw_units.isna(),
+        ('unidades', "Las unidades deben ser un número entero"):
+            raw_units.notna() & (units.isna() | (units % 1 != 0)),
+        ('unidades', "Las unidades no pueden ser negativas"): units < 0,
+    }
+    checks = {key: mask.to_numpy(dtype=bool) for key, mask in checks.items()}
+
+    low_stock = (units <= LOW_STOCK_THRESHOLD).to_numpy(dtype=bool)
+    values = df.assign(nombre_del_producto=names, descripción=descriptions,
+                       precio_por_unidad=prices, unidades=units)
+    return checks, low_stock, values
+
+
+def _add_errors(errors, row_numbers, column, message, mask):
+    """Añade al informe las filas marcadas en `mask` (hasta INVENTORY_MAX_ERRORS)"""
+    for row in row_numbers[mask][:INVENTORY_MAX_ERRORS]:
+        errors.append({"row": int(row), "column": column, "error": message})
+
+
+class InventoryValidator:
+    """
+    Valida los bloques del archivo de inventario según se leen
+
+    Comprueba tipos, valores nulos, longitudes, precios y unidades negativos
+    y nombres repetidos, y cuenta los productos con stock bajo. Cada bloque
+    se comprueba entero al leerlo (los repetidos, contra los nombres de los
+    bloques anteriores), así que los errores se conocen en cuanto aparece
+    la fila: `check` devuelve las filas válidas de cada bloque y `report` el
+    informe de todo el archivo.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.error_rows = 0
+        self.errors = []
+        self.low_stock = 0
+        self.low_stock_products = []
+        self.seconds = 0
+        self._seen_names = set()
+
+    def check(self, df):
+        """
+        Valida un bloque
+
+        Args:
+            df: DataFrame con las columnas de EXPECTED_COLUMNS
+
+        Returns:
+            Las filas sin errores del bloque, con los valores convertidos
+        """
+        start = time.perf_counter()
+        checks, low_stock_mask, values = validate_frame(df)
+
+        # Repetidos dentro del bloque o en bloques anteriores (gana la primera fila)
+        names = values['nombre_del_producto']
+        present = names.notna()
+        duplicated = present & (names.duplicated() | names.isin(self._seen_names))
+        checks[('nombre_del_producto', "Producto repetido en el archivo")] = duplicated.to_numpy(dtype=bool)
+        self._seen_names.update(names[present])
+
+        # Número de fila en el archivo (el índice del bloque, ver iter_inventory_frames)
+        row_numbers = df.index.to_numpy()
+        self.rows += len(df)
+
+        if len(self.errors) < INVENTORY_MAX_ERRORS:
+            for (column, message), mask in checks.items():
+                _add_errors(self.errors, row_numbers, column, message, mask)
+
+        invalid = np.logical_or.reduce(list(checks.values()))
+        self.error_rows += int(invalid.sum())
+
+        valid_low_stock = low_stock_mask & ~invalid
+        self.low_stock += int(valid_low_stock.sum())
+        missing = INVENTORY_MAX_ERRORS - len(self.low_stock_products)
+        if missing > 0:
+            self.low_stock_products += [str(name) for name in names[valid_low_stock][:missing]]
+
+        self.seconds += time.perf_counter() - start
+        return values[~invalid]
+
+    def valid_frames(self, frames):
+        """
+        Valida los bloques y devuelve sus filas válidas mientras el archivo no
+        tenga errores; desde el primer error se siguen validando (para el
+        informe) pero ya no se devuelven filas, porque no se van a guardar
+
+        Args:
+            frames: Iterable de DataFrames (ver iter_inventory_frames)
+
+        Returns:
+            Generador de DataFrames con las filas válidas
+        """
+        for df in frames:
+            rows = self.check(df)
+            if not self.error_rows:
+                yield rows
+
+    def report(self):
+        """
+        Informe de todos los bloques validados
+
+        Returns:
+            Informe con filas, errores (fila, columna, error) y stock bajo
+        """
+        errors = sorted(self.errors, key=lambda error: error["row"])
+        report = {
+            "rows": self.rows,
+            "error_rows": self.error_rows,
+            "errors": errors[:INVENTORY_MAX_ERRORS],
+            "low_stock": self.low_stock,
+            "low_stock_products": self.low_stock_products,
+            "seconds": round(self.seconds, 3)
+        }
+
+        print(f"Validación del inventario: {self.rows} filas, {self.error_rows} con errores en {self.seconds:.2f}s")
+        return report
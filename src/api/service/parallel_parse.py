@@ -0,0 +1,373 @@
+# En api/service/parallel_parse.py
+"""
+Lectura en paralelo de hojas .xlsx y CSV grandes
+
+El XML de la hoja (o el texto del CSV) se lee en el proceso principal y se
+corta en segmentos que terminan siempre en una fila completa (</row>, o un
+salto de línea fuera de comillas). Cada segmento se analiza en un proceso
+del pool y los resultados se devuelven en el orden original.
+"""
+import io
+import os
+import re
+import threading
+import zipfile
+import posixpath
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import xml.etree.ElementTree as ET
+import pandas as pd
+
+# Procesos para leer el archivo en paralelo (1 = lectura en serie con openpyxl)
+IMPORT_PARSE_WORKERS = int(os.getenv("IMPORT_PARSE_WORKERS", 1))
+
+# Por debajo de este tamaño (XML de la hoja sin comprimir) no compensa el pool
+IMPORT_PARSE_MIN_BYTES = int(os.getenv("IMPORT_PARSE_MIN_BYTES", 8 * 1024 * 1024))
+
+# Tamaño aproximado de cada segmento enviado a un proceso
+IMPORT_PARSE_SEGMENT_BYTES = int(os.getenv("IMPORT_PARSE_SEGMENT_BYTES", 4 * 1024 * 1024))
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+_ROW_TAG = f"{{{MAIN_NS}}}row"
+_CELL_TAG = f"{{{MAIN_NS}}}c"
+_VALUE_TAG = f"{{{MAIN_NS}}}v"
+_TEXT_TAG = f"{{{MAIN_NS}}}t"
+_INLINE_TAG = f"{{{MAIN_NS}}}is"
+
+_COLUMN_RE = re.compile(r"[A-Z]+")
+
+# La lectura en paralelo solo entiende hojas sin prefijo de espacio de nombres
+# (<worksheet>, <sheetData>, <row>); las demás se leen en serie
+_WORKSHEET_RE = re.compile(rb"<worksheet\b[^>]*>")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Cadenas compartidas del último libro leído en cada proceso del pool
+_shared_strings = None
+_shared_strings_source = None
+
+
+def _get_pool():
+    """Pool de procesos creado bajo demanda con "spawn" (seguro con hilos)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=IMPORT_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def first_sheet_path(archive):
+    """Ruta dentro del zip de la primera hoja del libro"""
+    workbook = ET.fromstring(archive.read("xl/workbook.xml"))
+    sheet = workbook.find(f"{{{MAIN_NS}}}sheets/{{{MAIN_NS}}}sheet")
+    rel_id = sheet.get(f"{{{REL_NS}}}id")
+
+    rels = ET.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    for rel in rels.iter(f"{{{PKG_REL_NS}}}Relationship"):
+        if rel.get("Id") == rel_id:
+            target = rel.get("Target")
+            if target.startswith("/"):
+                return target.lstrip("/")
+            return posixpath.normpath(posixpath.join("xl", target))
+
+    raise ValueError("No se encontró la hoja del libro")
+
+
+def should_parse_in_parallel(source):
+    """
+    Indica si el libro es lo bastante grande para leerlo en paralelo
+
+    Args:
+        source: Ruta del .xlsx o stream binario con posibilidad de seek
+    """
+    if IMPORT_PARSE_WORKERS <= 1:
+        return False
+    try:
+        with zipfile.ZipFile(source) as archive:
+            sheet_path = first_sheet_path(archive)
+            if archive.getinfo(sheet_path).file_size < IMPORT_PARSE_MIN_BYTES:
+                return False
+            with archive.open(sheet_path) as sheet:
+                head = sheet.read(64 * 1024)
+            return _WORKSHEET_RE.search(head) is not None and b"<sheetData" in head
+    except (zipfile.BadZipFile, KeyError, ValueError, AttributeError):
+        return False
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+
+def _load_shared_strings(file_path, source_id):
+    """Lee sharedStrings.xml (si existe) una sola vez por libro y proceso"""
+    global _shared_strings, _shared_strings_source
+    if _shared_strings_source == source_id:
+        return
+    _shared_strings = []
+    _shared_strings_source = source_id
+    with zipfile.ZipFile(file_path) as archive:
+        if "xl/sharedStrings.xml" not in archive.namelist():
+            return
+        with archive.open("xl/sharedStrings.xml") as source:
+            for _, element in ET.iterparse(source):
+                if element.tag == f"{{{MAIN_NS}}}si":
+                    # El texto puede venir partido en varios <r><t>
+                    _shared_strings.append(
+                        "".join(t.text or "" for t in element.iter(_TEXT_TAG)))
+                    element.clear()
+
+
+def _column_index(reference):
+    """Convierte la referencia de celda ("C12") en índice de columna (2)"""
+    index = 0
+    for letter in _COLUMN_RE.match(reference).group():
+        index = index * 26 + (ord(letter) - 64)
+    return index - 1
+
+
+def _cell_value(cell):
+    cell_type = cell.get("t", "n")
+
+    if cell_type == "inlineStr":
+        inline = cell.find(_INLINE_TAG)
+        return "".join(t.text or "" for t in inline.iter(_TEXT_TAG)) if inline is not None else None
+
+    value = cell.findtext(_VALUE_TAG)
+    if value is None:
+        return None
+    if cell_type == "s":
+        return _shared_strings[int(value)]
+    if cell_type == "b":
+        return value == "1"
+    if cell_type in ("str", "e"):
+        return value
+
+    number = float(value)
+    return int(number) if number.is_integer() and "." not in value and "E" not in value.upper() else number
+
+
+def _parse_segment(file_path, source_id, wrapper_open, segment):
+    """
+    Analiza un segmento de filas <row> y devuelve una lista de pares
+    (número de fila del atributo r o None, tupla de valores)
+    """
+    _load_shared_strings(file_path, source_id)
+
+    root = ET.fromstring(wrapper_open + segment + b"</sheetData>")
+    rows = []
+    for row in root.iter(_ROW_TAG):
+        values = []
+        for position, cell in enumerate(row.iter(_CELL_TAG)):
+            reference = cell.get("r")
+            index = _column_index(reference) if reference else position
+            while len(values) < index:
+                values.append(None)
+            values.append(_cell_value(cell))
+        number = row.get("r")
+        rows.append((int(number) if number else None, tuple(values)))
+    return rows
+
+
+def _iter_segments(source, segment_bytes):
+    """
+    Lee el XML descomprimido y genera (cabecera_sheetData, segmento), donde
+    cada segmento contiene solo filas <row> completas
+    """
+    buffer = b""
+    wrapper_open = None
+
+    while True:
+        data = source.read(segment_bytes)
+        buffer += data
+
+        if wrapper_open is None:
+            start = buffer.find(b"<sheetData")
+            if start == -1:
+                if not data:
+                    return
+                continue
+            end = buffer.find(b">", start)
+            if end == -1:
+                continue
+            if buffer[end - 1:end] == b"/":
+                # <sheetData/>: la hoja no tiene filas
+                return
+            # Las declaraciones de espacios de nombres de <worksheet> se copian
+            # a la etiqueta envolvente para que cada segmento sea XML válido
+            root_tag = _WORKSHEET_RE.search(buffer)
+            if root_tag is None:
+                raise ValueError("La hoja usa un prefijo de espacio de nombres")
+            root_tag = root_tag.group()
+            namespaces = b" ".join(re.findall(rb'xmlns(?::\w+)?="[^"]*"', root_tag))
+            wrapper_open = b"<sheetData " + namespaces + b">"
+            buffer = buffer[end + 1:]
+
+        cut = buffer.rfind(b"</row>")
+        if cut != -1 and (len(buffer) >= segment_bytes or not data):
+            cut += len(b"</row>")
+            yield wrapper_open, buffer[:cut]
+            buffer = buffer[cut:]
+
+        if not data:
+            return
+
+
+def iter_xlsx_rows_parallel(file_path):
+    """
+    Lee la primera hoja de un .xlsx en paralelo
+
+    Args:
+        file_path: Ruta del archivo .xlsx
+
+    Returns:
+        Generador de pares (número de fila o None, tupla con los valores);
+        la primera fila es la cabecera
+    """
+    pool = _get_pool()
+    # Como máximo dos segmentos por proceso en vuelo: la memoria no depende del archivo
+    window = IMPORT_PARSE_WORKERS * 2
+    pending = deque()
+
+    # Identifica el libro para no reutilizar cadenas de un archivo anterior
+    stat = os.stat(file_path)
+    source_id = (file_path, stat.st_size, stat.st_mtime_ns)
+
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open(first_sheet_path(archive)) as source:
+            for wrapper_open, segment in _iter_segments(source, IMPORT_PARSE_SEGMENT_BYTES):
+                pending.append(pool.submit(_parse_segment, file_path, source_id, wrapper_open, segment))
+                if len(pending) >= window:
+                    yield from pending.popleft().result()
+
+    while pending:
+        yield from pending.popleft().result()
+
+
+def should_parse_csv_in_parallel(source, compressed):
+    """
+    Indica si el CSV es lo bastante grande para leerlo en paralelo (los
+    comprimidos se leen en serie: no se pueden cortar sin descomprimir)
+
+    Args:
+        source: Ruta del CSV o stream binario con posibilidad de seek
+        compressed: Si el archivo viene en gzip
+    """
+    if IMPORT_PARSE_WORKERS <= 1 or compressed:
+        return False
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.getsize(source) >= IMPORT_PARSE_MIN_BYTES
+    size = source.seek(0, os.SEEK_END)
+    source.seek(0)
+    return size >= IMPORT_PARSE_MIN_BYTES
+
+
+def _last_row_end(buffer, quoted):
+    """
+    Posición justo después del último salto de línea de `buffer` que queda
+    fuera de comillas (o -1). `quoted` indica si el buffer empieza dentro de
+    un campo entre comillas; las comillas escapadas ("") no cambian la paridad.
+    """
+    pos = buffer.rfind(b"\n")
+    if pos == -1:
+        return -1
+    inside = (quoted + buffer.count(b'"', 0, pos)) % 2
+    while inside:
+        previous = buffer.rfind(b"\n", 0, pos)
+        if previous == -1:
+            return -1
+        inside ^= buffer.count(b'"', previous, pos) % 2
+        pos = previous
+    return pos + 1
+
+
+def _iter_csv_segments(source, segment_bytes):
+    """
+    Lee el CSV y genera (cabecera, segmento), donde cada segmento contiene
+    solo filas completas. La cabecera se repite para analizar cada segmento
+    por separado.
+    """
+    header = None
+    buffer = b""
+    quoted = 0
+
+    while True:
+        data = source.read(segment_bytes)
+        buffer += data
+
+        if header is None:
+            end = buffer.find(b"\n")
+            if end == -1:
+                if not data:
+                    return
+                continue
+            header = buffer[:end + 1]
+            buffer = buffer[end + 1:]
+
+        cut = len(buffer) if not data else _last_row_end(buffer, quoted)
+        if cut > 0 and (len(buffer) >= segment_bytes or not data):
+            segment = buffer[:cut]
+            quoted = (quoted + segment.count(b'"')) % 2
+            yield header, segment
+            buffer = buffer[cut:]
+
+        if not data:
+            return
+
+
+def _parse_csv_segment(header, segment, delimiter, decimal):
+    """Analiza un segmento del CSV (con su cabecera) y devuelve un DataFrame"""
+    # Las líneas en blanco se leen para poder contar las líneas del archivo
+    return pd.read_csv(io.BytesIO(header + segment), sep=delimiter,
+                       decimal=decimal, encoding="utf-8-sig", skip_blank_lines=False)
+
+
+def iter_csv_frames_parallel(source, delimiter, decimal):
+    """
+    Lee un CSV (sin comprimir) en paralelo
+
+    Args:
+        source: Ruta del archivo o stream binario (se lee desde el principio)
+        delimiter: Separador de columnas
+        decimal: Separador decimal
+
+    Returns:
+        Generador de DataFrames, en el orden del archivo; el índice es el
+        número de línea (la cabecera es la línea 1)
+    """
+    pool = _get_pool()
+    window = IMPORT_PARSE_WORKERS * 2
+    pending = deque()
+    first_row = 2
+
+    def next_frame():
+        nonlocal first_row
+        df = pending.popleft().result()
+        df.index = pd.RangeIndex(first_row, first_row + len(df))
+        first_row += len(df)
+        return df
+
+    if isinstance(source, (str, os.PathLike)):
+        f = open(source, "rb")
+    else:
+        f = source
+        f.seek(0)
+
+    try:
+        for header, segment in _iter_csv_segments(f, IMPORT_PARSE_SEGMENT_BYTES):
+            pending.append(pool.submit(_parse_csv_segment, header, segment, delimiter, decimal))
+            if len(pending) >= window:
+                yield next_frame()
+
+        while pending:
+            yield next_frame()
+    finally:
+        if f is not source:
+            f.close()
+        else:
+            f.seek(0)
@@ -0,0 +1,200 @@
+# En api/service/presign.py
+"""
+URLs prefirmadas de los objetos privados de Tigris
+
+En la base de datos se guarda solo la clave del objeto (no caduca) y la URL
+se firma al leer. Firmar es trabajo local, sin peticiones a Tigris.
+
+Todas las firmas usan como fecha el inicio de su franja de tiempo
+(PRESIGN_TIME_BUCKET): durante la franja la misma clave da siempre la misma
+URL, en cualquier petición y proceso, así que el navegador o la CDN la
+pueden guardar. Cada firma se guarda además en memoria hasta que termina su
+franja, y las respuestas con muchas imágenes firman todas sus claves de una
+vez (presigned_urls) con la clave de firma calculada una sola vez.
+"""
+import os
+import hmac
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse, unquote, quote
+from api.service.storage import (
+    get_s3_client, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_ENDPOINT_URL_S3, AWS_REGION)
+
+# Validez de las URLs prefirmadas (7 días, el máximo de SigV4)
+PRESIGN_EXPIRES = int(os.getenv("PRESIGN_EXPIRES", 3600 * 24 * 7))
+
+# Duración de cada franja de firma: una URL servida es válida durante al
+# menos PRESIGN_EXPIRES - PRESIGN_TIME_BUCKET segundos
+PRESIGN_TIME_BUCKET = int(os.getenv("PRESIGN_TIME_BUCKET", 3600 * 24))
+
+# Número máximo de firmas guardadas en memoria (por proceso)
+PRESIGN_CACHE_SIZE = int(os.getenv("PRESIGN_CACHE_SIZE", 10000))
+
+
+class PresignCache:
+    """
+    Caché LRU de URLs prefirmadas, con límite por número de entradas
+
+    Cada entrada guarda hasta cuándo se puede servir; a partir de ese momento
+    se trata como ausente y se vuelve a firmar.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            url, valid_until = entry
+            if now >= valid_until:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return url
+
+    def put(self, key, url, valid_until):
+        with self._lock:
+            self._entries[key] = (url, valid_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+presign_cache = PresignCache(PRESIGN_CACHE_SIZE)
+
+
+def _hmac(key, message):
+    return hmac.new(key, message.encode(), hashlib.sha256).digest()
+
+
+class _BucketSigner:
+    """
+    Firma SigV4 (en la query) de peticiones GET a un bucket, para una fecha
+    fija: la clave de firma se deriva una vez y cada URL cuesta un HMAC
+    """
+
+    def __init__(self, bucket_name, signed_at):
+        endpoint = urlparse(AWS_ENDPOINT_URL_S3)
+        self.base_url = f"{endpoint.scheme}://{endpoint.netloc}"
+        self.host = endpoint.netloc
+        self.bucket_path = "/" + quote(bucket_name, safe="")
+
+        self.timestamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(signed_at))
+        date = self.timestamp[:8]
+        self.scope = f"{date}/{AWS_REGION}/s3/aws4_request"
+
+        signing_key = _hmac(f"AWS4{AWS_SECRET_ACCESS_KEY}".encode(), date)
+        for part in (AWS_REGION, "s3", "aws4_request"):
+            signing_key = _hmac(signing_key, part)
+        self.signing_key = signing_key
+
+        # Parámetros ya ordenados y codificados, como pide la petición canónica
+        self.query = "&".join([
+            "X-Amz-Algorithm=AWS4-HMAC-SHA256",
+            "X-Amz-Credential=" + quote(f"{AWS_ACCESS_KEY_ID}/{self.scope}", safe=""),
+            f"X-Amz-Date={self.timestamp}",
+            f"X-Amz-Expires={PRESIGN_EXPIRES}",
+            "X-Amz-SignedHeaders=host"
+        ])
+
+    def sign(self, object_key):
+        path = f"{self.bucket_path}/{quote(object_key, safe='/~')}"
+        canonical_request = "\n".join([
+            "GET", path, self.query, f"host:{self.host}", "", "host", "UNSIGNED-PAYLOAD"])
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", self.timestamp, self.scope,
+            hashlib.sha256(canonical_request.encode()).hexdigest()])
+        signature = hmac.new(self.signing_key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        return f"{self.base_url}{path}?{self.query}&X-Amz-Signature={signature}"
+
+
+def presigned_urls(bucket_name, object_keys):
+    """
+    Firma de una vez las claves de una respuesta (catálogo, tienda...)
+
+    Args:
+        bucket_name: Bucket de los objetos
+        object_keys: Claves de los objetos (se ignoran las vacías y repetidas)
+
+    Returns:
+        Diccionario {clave: URL prefirmada}
+    """
+    now = time.time()
+    signed_at = int(now // PRESIGN_TIME_BUCKET * PRESIGN_TIME_BUCKET)
+    valid_until = signed_at + PRESIGN_TIME_BUCKET
+
+    urls = {}
+    missing = []
+    for object_key in object_keys:
+        if not object_key or object_key in urls:
+            continue
+        url = presign_cache.get((bucket_name, object_key), now)
+        urls[object_key] = url
+        if url is None:
+            missing.append(object_key)
+
+    if missing:
+        if AWS_ENDPOINT_URL_S3 and AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY:
+            sign = _BucketSigner(bucket_name, signed_at).sign
+        else:
+            # Sin endpoint o credenciales explícitas: se firma con boto3 (una a una)
+            s3 = get_s3_client()
+
+            def sign(key):
+                return s3.generate_presigned_url(
+                    'get_object', Params={'Bucket': bucket_name, 'Key': key},
+                    ExpiresIn=PRESIGN_EXPIRES)
+
+        for object_key in missing:
+            urls[object_key] = sign(object_key)
+            presign_cache.put((bucket_name, object_key), urls[object_key], valid_until)
+
+    return urls
+
+
+def presigned_url(bucket_name, object_key):
+    """
+    URL prefirmada (GET) de un objeto privado
+
+    Args:
+        bucket_name: Bucket del objeto
+        object_key: Clave del objeto; si está vacía se devuelve None
+
+    Returns:
+        URL válida durante al menos PRESIGN_EXPIRES - PRESIGN_TIME_BUCKET segundos
+    """
+    if not object_key:
+        return None
+    return presigned_urls(bucket_name, [object_key])[object_key]
+
+
+def object_key_from_url(url, bucket_name):
+    """
+    Extrae la clave del objeto de una URL (prefirmada o no) de nuestro bucket,
+    para los registros antiguos que solo guardaban la URL
+
+    Returns:
+        La clave, o None si la URL no apunta al bucket
+    """
+    if not url:
+        return None
+
+    parsed = urlparse(url)
+    path = unquote(parsed.path)
+
+    # Estilo ruta: https://endpoint/<bucket>/<clave>
+    prefix = f"/{bucket_name}/"
+    if path.startswith(prefix):
+        return path[len(prefix):] or None
+
+    # Estilo dominio: https://<bucket>.endpoint/<clave>
+    if parsed.hostname and parsed.hostname.startswith(bucket_name + "."):
+        return path.lstrip("/") or None
+
+    return None
@@ -0,0 +1,166 @@
+# En api/service/storage.py
+import os
+import threading
+import boto3
+import requests
+from boto3.s3.transfer import TransferConfig
+from botocore.client import Config
+from botocore.exceptions import ClientError
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+load_dotenv()
+
+# Configuración de AWS/Tigris
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_ENDPOINT_URL_S3 = os.getenv("AWS_ENDPOINT_URL_S3")
+AWS_REGION = os.getenv("AWS_REGION", "auto")
+
+# Buckets de la aplicación (los objetos son privados: se sirven con URLs prefirmadas)
+INVENTORY_BUCKET = "inventary-user-2025"
+LOGO_BUCKET = "img-logo-2025"
+
+# Conexiones abiertas que se reutilizan entre peticiones (por proceso)
+STORAGE_MAX_POOL_CONNECTIONS = int(os.getenv("STORAGE_MAX_POOL_CONNECTIONS", 50))
+
+# Reintentos ante errores de red, 5xx y limitación de peticiones
+STORAGE_MAX_ATTEMPTS = int(os.getenv("STORAGE_MAX_ATTEMPTS", 5))
+
+# Subidas grandes: por encima de STORAGE_PART_SIZE se envían por partes
+# (multipart), con STORAGE_UPLOAD_CONCURRENCY partes en paralelo. La memoria
+# de cada subida queda acotada a unas pocas partes.
+STORAGE_PART_SIZE = int(os.getenv("STORAGE_PART_SIZE", 8 * 1024 * 1024))
+STORAGE_UPLOAD_CONCURRENCY = int(os.getenv("STORAGE_UPLOAD_CONCURRENCY", 8))
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=STORAGE_PART_SIZE,
+    multipart_chunksize=STORAGE_PART_SIZE,
+    max_concurrency=STORAGE_UPLOAD_CONCURRENCY,
+    max_io_queue=STORAGE_UPLOAD_CONCURRENCY * 2
+)
+
+# "1" si los buckets ya se comprobaron al desplegar (flask ensure-buckets):
+# entonces las subidas no vuelven a comprobarlos
+STORAGE_BUCKETS_READY = os.getenv("STORAGE_BUCKETS_READY", "0") == "1"
+
+_lock = threading.Lock()
+_bucket_lock = threading.Lock()
+# Buckets ya comprobados en este proceso
+_known_buckets = set()
+_s3_client = None
+_http_session = None
+# Proceso que creó los clientes: tras un fork (gunicorn) se crean de nuevo
+_owner_pid = None
+
+
+def _check_fork():
+    """Descarta los clientes heredados del proceso padre (sus sockets son compartidos)"""
+    global _s3_client, _http_session, _owner_pid
+    if _owner_pid != os.getpid():
+        _s3_client = None
+        _http_session = None
+        _owner_pid = os.getpid()
+
+
+def get_s3_client():
+    """
+    Cliente S3 de Tigris compartido por todo el proceso
+
+    Se crea la primera vez que se usa (después del fork de gunicorn), con un
+    pool de conexiones reutilizables y reintentos. Los clientes de boto3 se
+    pueden usar desde varios hilos.
+    """
+    global _s3_client
+    with _lock:
+        _check_fork()
+        if _s3_client is None:
+            # Sesión propia: la sesión por defecto de boto3 no es segura entre hilos
+            session = boto3.session.Session()
+            _s3_client = session.client(
+                's3',
+                aws_access_key_id=AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                endpoint_url=AWS_ENDPOINT_URL_S3,
+                region_name=AWS_REGION,
+                config=Config(
+                    signature_version='s3v4',
+                    max_pool_connections=STORAGE_MAX_POOL_CONNECTIONS,
+                    retries={'total_max_attempts': STORAGE_MAX_ATTEMPTS, 'mode': 'standard'}
+                )
+            )
+        return _s3_client
+
+
+def get_http_session():
+    """
+    Sesión HTTP compartida (requests) con pool de conexiones, para las APIs
+    de Tigris que no van por S3
+
+    El adaptador no reintenta nada: los cuerpos se envían en streaming y no
+    se pueden repetir sin rebobinarlos, así que todos los reintentos (también
+    los fallos al conectar) los hace quien sube (ver tigris_service). Con una
+    sola capa de reintentos el número máximo de intentos es el configurado.
+    """
+    global _http_session
+    with _lock:
+        _check_fork()
+        if _http_session is None:
+            adapter = HTTPAdapter(
+                pool_connections=STORAGE_MAX_POOL_CONNECTIONS,
+                pool_maxsize=STORAGE_MAX_POOL_CONNECTIONS,
+                max_retries=0
+            )
+            _http_session = requests.Session()
+            _http_session.mount("https://", adapter)
+            _http_session.mount("http://", adapter)
+        return _http_session
+
+
+def check_bucket(bucket_name):
+    """Comprueba que el bucket existe y lo crea si no (una petición o dos)"""
+    s3 = get_s3_client()
+    try:
+        s3.head_bucket(Bucket=bucket_name)
+    except ClientError:
+        s3.create_bucket(Bucket=bucket_name)
+    _known_buckets.add(bucket_name)
+
+
+def ensure_bucket(bucket_name):
+    """
+    Se asegura de que el bucket existe. Solo la primera subida de cada
+    proceso lo comprueba; después (o con STORAGE_BUCKETS_READY=1) no hace
+    ninguna petición.
+    """
+    if STORAGE_BUCKETS_READY or bucket_name in _known_buckets:
+        return
+    with _bucket_lock:
+        if bucket_name not in _known_buckets:
+            check_bucket(bucket_name)
+
+
+def upload_stream(fileobj, bucket_name, object_key, content_type):
+    """
+    Sube un objeto archivo (por ejemplo el stream de la petición) sin
+    leerlo entero: los objetos pequeños van en un solo PUT y los grandes
+    por partes en paralelo (ver TRANSFER_CONFIG)
+    """
+    get_s3_client().upload_fileobj(
+        fileobj,
+        bucket_name,
+        object_key,
+        ExtraArgs={'ContentType': content_type},
+        Config=TRANSFER_CONFIG
+    )
+
+
+def upload_path(file_path, bucket_name, object_key, content_type):
+    """Sube un archivo del disco (por partes en paralelo si es grande)"""
+    get_s3_client().upload_file(
+        file_path,
+        bucket_name,
+        object_key,
+        ExtraArgs={'ContentType': content_type},
+        Config=TRANSFER_CONFIG
+    )
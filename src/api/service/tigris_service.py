@@ -1,17 +1,39 @@
 # En api/services/tigris_service.py
 import os
+import time
+import random
+import mimetypes
 import requests
 from flask import current_app
+from api.service.storage import get_http_session
+
+# Tiempo máximo para abrir la conexión y para esperar cada lectura de la respuesta
+TIGRIS_CONNECT_TIMEOUT = float(os.getenv("TIGRIS_CONNECT_TIMEOUT", 5))
+TIGRIS_READ_TIMEOUT = float(os.getenv("TIGRIS_READ_TIMEOUT", 60))
+
+# Reintentos de la subida con espera exponencial (0.5s, 1s, 2s... + aleatorio).
+# Es la única capa de reintentos: la sesión HTTP compartida no reintenta
+TIGRIS_MAX_ATTEMPTS = int(os.getenv("TIGRIS_MAX_ATTEMPTS", 4))
+TIGRIS_BACKOFF_SECONDS = float(os.getenv("TIGRIS_BACKOFF_SECONDS", 0.5))
+
+# Respuestas que indican un fallo temporal del servidor
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
 
 def upload_file_to_tigris(file, filename, folder):
     """
     Sube un archivo a TigrisData y devuelve la URL
-    
+
+    El cuerpo se envía en streaming (sin leer el archivo entero en memoria)
+    por la sesión compartida, que reutiliza las conexiones TLS. Los errores
+    de red, los timeouts y las respuestas 429/5xx se reintentan rebobinando
+    el archivo.
+
     Args:
         file: Archivo a subir
         filename: Nombre del archivo
         folder: Carpeta donde guardar (productos, logos, etc.)
-    
+
     Returns:
         URL del archivo subido
     """
@@ -19,32 +41,60 @@ def upload_file_to_tigris(file, filename, folder):
     tigris_api_key = os.environ.get('TIGRIS_API_KEY')
     tigris_project = os.environ.get('TIGRIS_PROJECT')
     tigris_bucket = os.environ.get('TIGRIS_BUCKET')
-    
+
     if not all([tigris_api_key, tigris_project, tigris_bucket]):
         raise ValueError("Faltan credenciales de TigrisData")
-    
+
     # Construir path en TigrisData
     path = f"{folder}/{filename}"
-    
-    # Leer contenido del archivo
-    file_content = file.read()
-    
+
+    # Stream del archivo (FileStorage de la subida o un objeto archivo)
+    body = getattr(file, "stream", file)
+    start = body.tell() if hasattr(body, "seekable") and body.seekable() else None
+
+    # Tipo de contenido: el de la subida (FileStorage) o el de la extensión
+    content_type = (getattr(file, "content_type", None)
+                    or mimetypes.guess_type(filename)[0]
+                    or "application/octet-stream")
+
     # Preparar headers
     headers = {
         "Authorization": f"Bearer {tigris_api_key}",
-        "Content-Type": file.content_type
+        "Content-Type": content_type
     }
-    
+
     # URL de la API de TigrisData
     url = f"https://api.tigrisdata.cloud/v1/projects/{tigris_project}/buckets/{tigris_bucket}/files/{path}"
-    
-    # Subir archivo
-    response = requests.put(url, headers=headers, data=file_content)
-    
+
+    # Subir archivo (sesión compartida: reutiliza la conexión)
+    session = get_http_session()
+    for attempt in range(1, TIGRIS_MAX_ATTEMPTS + 1):
+        try:
+            response = session.put(
+                url, headers=headers, data=body,
+                timeout=(TIGRIS_CONNECT_TIMEOUT, TIGRIS_READ_TIMEOUT))
+            error = None if response.status_code not in RETRY_STATUSES else f"HTTP {response.status_code}"
+        except (requests.ConnectionError, requests.Timeout) as e:
+            response = None
+            error = str(e)
+
+        # Sin error temporal, sin intentos o sin poder rebobinar: no se reintenta
+        if error is None or attempt == TIGRIS_MAX_ATTEMPTS or start is None:
+            break
+
+        delay = TIGRIS_BACKOFF_SECONDS * 2 ** (attempt - 1)
+        delay += random.uniform(0, TIGRIS_BACKOFF_SECONDS)
+        print(f"Error al subir {path} a TigrisData (intento {attempt}): {error}. Reintento en {delay:.1f}s")
+        time.sleep(delay)
+        body.seek(start)
+
+    if response is None:
+        raise Exception(f"Error al subir archivo a TigrisData: {error}")
+
     if response.status_code != 200:
         raise Exception(f"Error al subir archivo a TigrisData: {response.text}")
-    
+
     # Devolver URL pública
     public_url = f"https://assets.tigrisdata.cloud/{tigris_project}/{tigris_bucket}/{path}"
-    
-    return public_url
\ No newline at end of file
+
+    return public_url
@@ -0,0 +1,161 @@
+# En api/service/xlsx_stream.py
+"""
+Escritura en streaming de libros .xlsx de una sola hoja
+
+El zip se escribe sobre un destino sin seek (con descriptores de datos), así
+que los bytes se pueden enviar al cliente a medida que se generan, sin
+guardar el libro entero en memoria ni en disco.
+"""
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetData>'
+)
+SHEET_END = '</sheetData></worksheet>'
+
+# Caracteres de control que no se pueden escribir en XML
+_ILLEGAL_XML_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class _ChunkBuffer:
+    """Destino de escritura sin seek: acumula los bytes hasta que se recogen"""
+
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._size
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _column_letter(index):
+    """Convierte el índice de columna (0) en su letra ("A")"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _cell_xml(reference, value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{reference}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c r="{reference}"><v>{value}</v></c>'
+    text = escape(_ILLEGAL_XML_RE.sub("", str(value)))
+    return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row_xml(row_number, values, letters):
+    cells = "".join(_cell_xml(f"{letter}{row_number}", value)
+                    for letter, value in zip(letters, values))
+    return f'<row r="{row_number}">{cells}</row>'
+
+
+def iter_xlsx(header, batches, sheet_name="Hoja1"):
+    """
+    Genera un .xlsx por trozos de bytes a medida que llegan las filas
+
+    Args:
+        header: Nombres de las columnas (primera fila)
+        batches: Iterable de lotes de filas (tuplas con los valores)
+        sheet_name: Nombre de la hoja
+
+    Returns:
+        Generador de bytes listos para enviar
+    """
+    letters = [_column_letter(i) for i in range(len(header))]
+    buffer = _ChunkBuffer()
+
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES_XML)
+        archive.writestr("_rels/.rels", ROOT_RELS_XML)
+        archive.writestr("xl/workbook.xml", WORKBOOK_XML.format(sheet_name=escape(sheet_name)))
+        archive.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS_XML)
+        archive.writestr("xl/styles.xml", STYLES_XML)
+        yield buffer.take()
+
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(SHEET_START.encode())
+            sheet.write(_row_xml(1, header, letters).encode())
+            row_number = 1
+            for batch in batches:
+                rows = []
+                for values in batch:
+                    row_number += 1
+                    rows.append(_row_xml(row_number, values, letters))
+                sheet.write("".join(rows).encode())
+
+                # El compresor va soltando bytes según se llena su ventana
+                data = buffer.take()
+                if data:
+                    yield data
+            sheet.write(SHEET_END.encode())
+
+    yield buffer.take()
@@ -1,4 +1,18 @@
-from flask import jsonify, url_for
+from flask import jsonify, url_for, Request
+from tempfile import SpooledTemporaryFile
+import os
+
+# Las subidas se quedan en memoria hasta este tamaño; a partir de ahí pasan
+# a un archivo temporal privado (sin nombre en la carpeta de trabajo)
+UPLOAD_SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", 32 * 1024 * 1024))
+
+
+class SpooledUploadRequest(Request):
+    """Request de Flask que guarda los archivos subidos en un buffer en memoria"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES, mode="rb+")
+
 
 class APIException(Exception):
     status_code = 400
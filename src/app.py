@@ -7,7 +7,7 @@ from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 
 # IMPORTACIONES DEL PROYECTO
-from api.utils import APIException, generate_sitemap
+from api.utils import APIException, generate_sitemap, SpooledUploadRequest
 from api.models import db
 from api.Routes.routes import api
 from api.Routes.upload_routes import upload
@@ -16,12 +16,16 @@ from api.Routes.customer_routes import customer
 from api.Routes.upload_logo import up_logo
 from api.admin import setup_admin
 from api.commands import setup_commands
+from api.service.import_jobs import setup_job_recovery
 
 load_dotenv()
 
 # CREAR LA INSTANCIA DE LA APLICACIÓN FLASK
 app = Flask(__name__)
 
+# LOS ARCHIVOS SUBIDOS SE PROCESAN DESDE MEMORIA (O UN TEMPORAL PRIVADO SI SON MUY GRANDES)
+app.request_class = SpooledUploadRequest
+
 # Registra el Blueprint con el prefijo de URL
 app.register_blueprint(api, url_prefix='/api')
 app.register_blueprint(upload, url_prefix='/upload')
@@ -75,6 +79,9 @@ def handle_invalid_usage(error):
 setup_admin(app)
 setup_commands(app)
 
+# RECUPERAR LOS TRABAJOS DE IMPORTACIÓN QUE QUEDARON PENDIENTES TRAS UN REINICIO
+setup_job_recovery(app)
+
 # RUTA PARA GENERAR EL SITEMAP DE LA API
 @app.route('/')
 def sitemap():
@@ -57,7 +57,8 @@ const InventoryManager = () => {
       });
 
       alert(response.data.message);
-      console.log("URL del archivo en Tigris:", response.data.file_url);
+      // El archivo se archiva en Tigris en segundo plano ("pending" -> "stored")
+      console.log("Archivo en Tigris:", response.data.file_id, response.data.file_status);
       
       setUploadSuccess(true);
     } catch (error) {
@@ -9,7 +9,7 @@ const ProductCard = ({ product }) => {
     <div className="product-card">
       <div className="product-image">
         {product.image_url ? (
-          <img src={product.image_url} alt={product.name} />
+          <img src={product.image_thumbnail_url || product.image_url} alt={product.name} />
         ) : (
           <div className="no-image">No image</div>
         )}
@@ -361,6 +361,7 @@ const Catalog = () => {
                     <div className="product-image-container">
                       <img
                         src={
+                          product.image_thumbnail_url ||
                           product.image_url ||
                           "https://placehold.co/600x400/EEE/31343C"
                         }
@@ -218,6 +218,7 @@ const StoreFront = () => {
                 <div className="product-image-container">
                   <img
                     src={
+                      product.image_thumbnail_url ||
                       product.image_url ||
                       "https://placehold.co/600x400/EEE/31343C"
                     }